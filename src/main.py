@@ -1,30 +1,39 @@
 import flet as ft
-import logging
-import traceback
+import threading
 from src.models.database import Database
 from src.ui.components import SnippetEditor
 from src.ui.dialogs import AddSnippetDialog, EditSnippetDialog
 from src.ui.snippet_card import SnippetCard
+from src.ui.grid_reconciler import GridReconciler
 from src.ui.main_editor_view import MainEditorView
+from src.ui.virtual_grid import GridVirtualizer
+from src.utils.constants import (
+    AI_PREFETCH_ENV, AI_PREFETCH_NEXT_ENV, GRID_BUFFER_ROWS, GRID_LOAD_MORE_THRESHOLD, GRID_RELEASE_ROWS, GRID_VIRTUALIZATION,
+    SEARCH_DEBOUNCE_SECONDS, SEMANTIC_SEARCH_LIMIT, SNIPPETS_PAGE_SIZE
+)
+from src.utils.debounce import SearchController
+from src.utils.logging_config import get_logger, setup_logging
 import os
 
 from src.ui.study_view import StudySnippetView
 
-logging.basicConfig(level=logging.DEBUG, format="DEBUG: %(message)s")
-logger = logging.getLogger("snippethub")
+setup_logging()
+logger = get_logger("app")
 
 def main(page: ft.Page):
-    print("DEBUG: Запуск main функции")
+    logger.debug("Запуск main функции")
     page.title = "SnippetHub"
     page.window.width = 1200
     page.window.height = 800
 
     try:
         db = Database()
-        print("DEBUG: БД успешно инициализирована")
+        logger.debug("БД успешно инициализирована")
+        # Старые YAML-записи перекодируются в фоне, UI читает оба формата
+        db.start_content_migration()
     except Exception as e:
-        print(f"DEBUG: Ошибка БД при старте: {e}. Пересоздание.")
-        os.remove(db.db_name) if 'db' in locals() else print("DEBUG: Файл БД не найден")
+        logger.warning("Ошибка БД при старте: %s. Пересоздание.", e)
+        os.remove(db.db_name) if 'db' in locals() else logger.debug("Файл БД не найден")
         db = Database()
 
     mode = ft.Ref[str]()
@@ -68,6 +77,7 @@ def main(page: ft.Page):
         else:
             main_row.visible = True
             page.add(main_row)
+        grid_remounted()
 
         is_in_main_editor.current = False
         main_editor_view.current = None
@@ -76,41 +86,179 @@ def main(page: ft.Page):
         page.update()
 
     def refresh_list(snippets_grid, search_field):
-        print("DEBUG: Обновление списка сниппетов")
-        load_snippets(snippets_grid, db, search_field.value or "")
+        logger.debug("Обновление списка сниппетов")
+        load_snippets(snippets_grid, db, search_field.value or "", keep_loaded=True)
 
     def on_search(e, snippets_grid):
-        print(f"DEBUG: Поиск изменён: {e.control.value}")
-        load_snippets(snippets_grid, db, e.control.value or "")
+        logger.debug("Поиск изменён: %s", e.control.value)
+        search_controller.submit(e.control.value or "")
+
+    # Состояние keyset-пагинации сетки: текущий запрос и id последней загруженной карточки;
+    # semantic — поиск по эмбеддингам, его результаты не листаются;
+    # shown_semantic — в каком режиме получены показанные результаты
+    grid_state = {"query": "", "last_id": None, "has_more": False, "semantic": False, "shown_semantic": False}
+    grid_page_lock = threading.Lock()
+    grid_reconciler = None
+    grid_virtualizer = None
+
+    def make_snippet_card(snippet: dict) -> SnippetCard:
+        card = SnippetCard(
+            snippet_id=snippet['id'],
+            title=snippet['title'],
+            language=snippet['language'],
+            cells=snippet['cells'],
+            tags=snippet['tags'],
+            revision=snippet.get('revision'),
+            preview=snippet.get('preview'),
+            on_copy=lambda yaml_content: on_copy(yaml_content, page),
+            on_delete=lambda sid: confirm_delete_snippet(page, db, lambda: refresh_list(snippets_grid, search_field), sid),
+            # Теги берутся из карточки: после обновления она переиспользуется с новыми данными
+            on_edit=lambda sid, t, l, c: open_edit_dialog(page, db, sid, t, l, c, card.tags, switch_mode),
+            on_study=lambda sid, t, l, c, tags: open_study_view(page, db, sid),
+            blob_store=db.blobs,
+            # Содержимое строит GridVirtualizer, когда карточка попадает в видимую область
+            materialized=not GRID_VIRTUALIZATION
+        )
+        return card
+
+    def fetch_snippets(search_query: str, limit: int = SNIPPETS_PAGE_SIZE) -> tuple:
+        """Первая страница результатов запроса и признак, что есть следующая."""
+        if grid_state["semantic"] and search_query.strip():
+            return db.semantic_search(search_query, limit=SEMANTIC_SEARCH_LIMIT), False
+        snippets = db.get_snippets_page(search_query, limit=limit)
+        return snippets, len(snippets) == limit
+
+    def load_snippets(container: ft.GridView, db: Database, search_query: str = "", keep_loaded: bool = False):
+        logger.debug("Загрузка сниппетов с запросом '%s'", search_query)
+        if grid_state["semantic"] and search_query.strip():
+            # Семантический поиск досчитывает эмбеддинги через модель — только вне UI-потока
+            search_controller.submit(search_query)
+            return
+        limit = SNIPPETS_PAGE_SIZE
+        if keep_loaded and search_query == grid_state["query"]:
+            # При обновлении того же запроса сохраняем уже подгруженные прокруткой страницы
+            limit = max(limit, len(container.controls))
+        try:
+            snippets, has_more = fetch_snippets(search_query, limit)
+            show_snippets(container, search_query, snippets, has_more)
+        except Exception as ex:
+            logger.exception("Ошибка в load_snippets: %s", ex)
+            show_error(f"Не удалось загрузить сниппеты: {ex}")
+
+    def grid_viewport() -> tuple:
+        """Размер области сетки: в режиме редактирования она делит строку с редактором пополам."""
+        width = page.width or page.window.width
+        if width:
+            # Отступы страницы (10 по умолчанию) и контейнера списка (по 10 с каждой стороны)
+            page_padding = page.padding if isinstance(page.padding, (int, float)) else 10
+            width -= 2 * page_padding
+            if mode.current == "edit":
+                # main_row: два контейнера с expand=True и промежутком Row по умолчанию (10)
+                width = (width - 10) / 2
+            width -= 20
+        return width, page.height or page.window.height
+
+    def on_page_resized(e):
+        """Ширина окна меняет число колонок сетки — пересчитываем видимые карточки."""
+        if grid_virtualizer and (snippet_list in page.controls or main_row in page.controls):
+            grid_virtualizer.apply()
+
+    page.on_resized = on_page_resized
+
+    def grid_remounted():
+        """Сетка заново добавлена на страницу: клиент создал её с нулевой позицией прокрутки."""
+        if grid_virtualizer:
+            grid_virtualizer.reset()
+            grid_virtualizer.apply(update=False)
+
+    def show_snippets(container: ft.GridView, search_query: str, snippets: list, has_more: bool):
+        """Приводит сетку к результатам запроса, переиспользуя карточки по snippet_id."""
+        semantic = grid_state["semantic"] and bool(search_query.strip())
+        with grid_page_lock:
+            if search_query != grid_state["query"] or semantic != grid_state["shown_semantic"]:
+                # Результаты нового запроса (или другого режима поиска) показываются с начала
+                if grid_virtualizer:
+                    grid_virtualizer.reset()
+                if container.page:
+                    container.scroll_to(offset=0, duration=0)
+            changed = grid_reconciler.reconcile(snippets)
+            if grid_virtualizer:
+                changed = grid_virtualizer.apply(update=False) or changed
+            grid_state.update(
+                query=search_query,
+                shown_semantic=semantic,
+                last_id=snippets[-1]['id'] if snippets else None,
+                has_more=has_more
+            )
+        if changed and container.page:
+            container.update()
+        logger.debug("Загружено %s сниппетов", len(container.controls))
+
+    def show_error(message: str):
+        page.snack_bar = ft.SnackBar(ft.Text(message), bgcolor=ft.colors.ERROR)
+        page.snack_bar.open = True
+        page.update()
 
-    def load_snippets(container: ft.GridView, db: Database, search_query: str = ""):
-        print(f"DEBUG: Загрузка сниппетов с запросом '{search_query}'")
+    def on_search_error(ex: Exception):
+        logger.error("Ошибка поиска: %s", ex, exc_info=ex)
+        show_error(f"Ошибка поиска: {ex}")
+
+    # Запрос к БД выполняется в фоне после паузы ввода; устаревшие результаты отбрасываются
+    search_controller = SearchController(
+        fetch=fetch_snippets,
+        apply=lambda query, result: show_snippets(snippets_grid, query, *result),
+        delay=SEARCH_DEBOUNCE_SECONDS,
+        on_error=on_search_error
+    )
+
+    def load_next_page(container: ft.GridView):
+        # Параллельные события прокрутки не должны загружать одну страницу дважды
+        if not grid_page_lock.acquire(blocking=False):
+            return
         try:
-            container.controls.clear()
-            snippets = db.get_snippets(search_query)
+            if not grid_state["has_more"]:
+                return
+            snippets = db.get_snippets_page(grid_state["query"], after_id=grid_state["last_id"])
             for snippet in snippets:
-                print(f"DEBUG: Добавление карточки для сниппета ID {snippet['id']}")
-                card = SnippetCard(
-                    snippet_id=snippet['id'],
-                    title=snippet['title'],
-                    language=snippet['language'],
-                    cells=snippet['cells'],
-                    on_copy=lambda yaml_content: on_copy(yaml_content, page),
-                    on_delete=lambda sid: confirm_delete_snippet(page, db, lambda: refresh_list(snippets_grid, search_field), sid),
-                    on_edit=lambda sid, t, l, c: open_edit_dialog(page, db, sid, t, l, c, snippet['tags'], switch_mode),
-                    on_study=lambda sid, t, l, c, tags: open_study_view(page, db, sid)
-                )
-                container.controls.append(card)
+                logger.debug("Добавление карточки для сниппета ID %s", snippet['id'])
+                container.controls.append(make_snippet_card(snippet))
+            if snippets:
+                grid_state["last_id"] = snippets[-1]['id']
+            grid_state["has_more"] = len(snippets) == SNIPPETS_PAGE_SIZE
+            if grid_virtualizer:
+                grid_virtualizer.apply(update=False)
             page.update()
-            logger.debug(f"Загружено {len(container.controls)} сниппетов")
+            logger.debug("Загружено %s сниппетов", len(container.controls))
         except Exception as ex:
-            print(f"DEBUG: Ошибка в load_snippets: {ex}")
-            logger.error(f"Ошибка в load_snippets: {ex}")
-            traceback.print_exc()
+            logger.exception("Ошибка в load_snippets: %s", ex)
+        finally:
+            grid_page_lock.release()
+
+    def on_grid_scroll(e: ft.OnScrollEvent):
+        if grid_virtualizer:
+            grid_virtualizer.on_scroll(e)
+        if e.max_scroll_extent is not None and e.pixels >= e.max_scroll_extent - GRID_LOAD_MORE_THRESHOLD:
+            load_next_page(e.control)
+
+    def toggle_semantic_search(e):
+        grid_state["semantic"] = not grid_state["semantic"]
+        e.control.selected = grid_state["semantic"]
+        e.control.update()
+        search_controller.submit(search_field.value or "")
 
     def build_snippet_list():
         search_field = ft.TextField(label="Поиск", expand=True)
         search_field.on_change = lambda e: on_search(e, snippets_grid)
+        # Поиск по смыслу через эмбеддинги (нужны numpy и модель эмбеддингов в Ollama)
+        semantic_available = db.embeddings.available
+        semantic_button = ft.IconButton(
+            icon=ft.icons.AUTO_AWESOME_OUTLINED,
+            selected_icon=ft.icons.AUTO_AWESOME,
+            selected=False,
+            disabled=not semantic_available,
+            tooltip="Поиск по смыслу" if semantic_available else "Поиск по смыслу недоступен: не установлен numpy",
+            on_click=toggle_semantic_search
+        )
 
         # Изначально 3 колонки → max_extent=400
         snippets_grid = ft.GridView(
@@ -118,14 +266,32 @@ def main(page: ft.Page):
             max_extent=400,  # ← главное свойство
             child_aspect_ratio=1.0,
             spacing=10,
-            run_spacing=10
+            run_spacing=10,
+            on_scroll=on_grid_scroll,
+            on_scroll_interval=100
         )
+        nonlocal grid_reconciler, grid_virtualizer
+        grid_reconciler = GridReconciler(snippets_grid, make_snippet_card)
+        if GRID_VIRTUALIZATION:
+            grid_virtualizer = GridVirtualizer(
+                snippets_grid,
+                viewport=grid_viewport,
+                buffer_rows=GRID_BUFFER_ROWS,
+                release_rows=GRID_RELEASE_ROWS
+            )
 
         def change_grid_columns(cols: int):
             extent_map = {1: 1200, 2: 600, 3: 400, 4: 300}
-            snippets_grid.max_extent = extent_map.get(cols, 400)
-            # Перезагрузить сниппеты, чтобы Flet пересчитал layout
-            refresh_list(snippets_grid, search_field)
+            max_extent = extent_map.get(cols, 400)
+            if snippets_grid.max_extent == max_extent:
+                return
+            # Чисто визуальная операция: клиенту уходит только новое max_extent,
+            # карточки остаются прежними, БД не запрашивается
+            snippets_grid.max_extent = max_extent
+            if grid_virtualizer:
+                # Число колонок изменилось — другие карточки оказываются в видимых рядах
+                grid_virtualizer.apply(update=False)
+            snippets_grid.update()
 
         grid_buttons = ft.Row([
             ft.IconButton(ft.icons.VIEW_LIST, tooltip="1 колонка", on_click=lambda _: change_grid_columns(1)),
@@ -145,7 +311,7 @@ def main(page: ft.Page):
 
         container = ft.Container(
             content=ft.Column([
-                ft.Row([search_field, header_buttons]),
+                ft.Row([search_field, semantic_button, header_buttons]),
                 ft.Divider(),
                 snippets_grid
             ]),
@@ -170,9 +336,30 @@ def main(page: ft.Page):
         def on_back():
             switch_mode("list")
 
+        # Фоновая подготовка объяснений включается через окружение
+        prefetch = os.environ.get(AI_PREFETCH_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+        try:
+            prefetch_next = int(os.environ.get(AI_PREFETCH_NEXT_ENV, "0"))
+        except ValueError:
+            prefetch_next = 0
+        grid_ids = [c.snippet_id for c in snippets_grid.controls if isinstance(c, SnippetCard)]
+        next_ids = []
+        if prefetch and prefetch_next > 0 and snippet_id in grid_ids:
+            start = grid_ids.index(snippet_id) + 1
+            next_ids = grid_ids[start:start + prefetch_next]
+
+        def load_next_snippets():
+            return [s for s in (db.get_snippet_by_id(sid) for sid in next_ids) if s]
+
         # Оборачиваем в Container с expand=True — это КЛЮЧ
         study_container = ft.Container(
-            content=StudySnippetView(snippet=snippet, on_back=on_back),
+            content=StudySnippetView(
+                snippet=snippet,
+                on_back=on_back,
+                explanation_cache=db.explanations,
+                prefetch=prefetch,
+                prefetch_snippets=load_next_snippets if next_ids else None
+            ),
             expand=True
         )
 
@@ -182,7 +369,7 @@ def main(page: ft.Page):
 
 
     def switch_mode(new_mode: str, snippet_id: int = None):
-        print(f"DEBUG: Переключение режима на {new_mode}, snippet_id={snippet_id}")
+        logger.debug("Переключение режима на %s, snippet_id=%s", new_mode, snippet_id)
         # Если мы в большом редакторе - выходим из него
         if is_in_main_editor.current:
             switch_from_main_editor()
@@ -191,12 +378,13 @@ def main(page: ft.Page):
         if new_mode == "edit" and snippet_id:
             current_snippet_id.current = snippet_id
             snippet = db.get_snippet_by_id(snippet_id)
-            print(f"DEBUG: Загружен сниппет для редактирования: {snippet['title'] if snippet else 'Не найден'}")
+            logger.debug("Загружен сниппет для редактирования: %s", snippet['title'] if snippet else 'Не найден')
             if snippet:
                 editor = SnippetEditor(snippet=snippet, on_save=lambda updated: on_save_full_editor(updated, db,
                                                                                                     lambda: refresh_list(
                                                                                                         snippets_grid,
-                                                                                                        search_field)))
+                                                                                                        search_field)),
+                                       blob_store=db.blobs)
                 editor_container.content = editor.build()
         page.controls.clear()
         if new_mode == "list":
@@ -204,15 +392,16 @@ def main(page: ft.Page):
         else:
             main_row.visible = True
             page.add(main_row)
+        grid_remounted()
         page.update()
 
     switch_mode("list")
 
     def confirm_delete_snippet(page: ft.Page, db: Database, refresh_func, snippet_id: int):
-        print(f"DEBUG: Открытие диалога подтверждения удаления для {snippet_id}")
+        logger.debug("Открытие диалога подтверждения удаления для %s", snippet_id)
 
         def on_confirm(e):
-            print("DEBUG: Подтверждение удаления")
+            logger.debug("Подтверждение удаления")
             db.delete_snippet(snippet_id)
             page.snack_bar = ft.SnackBar(ft.Text("Сниппет удалён"))
             page.snack_bar.open = True
@@ -221,7 +410,7 @@ def main(page: ft.Page):
             page.update()
 
         def on_cancel(e):
-            print("DEBUG: Отмена удаления")
+            logger.debug("Отмена удаления")
             page.dialog.open = False
             page.update()
 
@@ -239,7 +428,7 @@ def main(page: ft.Page):
         page.update()
 
     def on_copy(yaml_content: str, page: ft.Page):
-        print("DEBUG: Копирование YAML контента")
+        logger.debug("Копирование YAML контента")
         import pyperclip
         pyperclip.copy(yaml_content)
         page.snack_bar = ft.SnackBar(ft.Text("YAML скопирован в буфер!"))
@@ -247,7 +436,7 @@ def main(page: ft.Page):
         page.update()
 
     def on_save_full_editor(updated_snippet: dict, db: Database, refresh_func):
-        print(f"DEBUG: Сохранение полного редактора для сниппета {updated_snippet['id']}")
+        logger.debug("Сохранение полного редактора для сниппета %s", updated_snippet['id'])
         db.update_snippet(updated_snippet['id'], updated_snippet['title'], updated_snippet['language'], updated_snippet['cells'], updated_snippet['tags'])
         page.snack_bar = ft.SnackBar(ft.Text("Сниппет сохранён"))
         page.snack_bar.open = True
@@ -294,5 +483,5 @@ def main(page: ft.Page):
 
 
 if __name__ == "__main__":
-    print("DEBUG: Запуск приложения")
+    logger.debug("Запуск приложения")
     ft.app(target=main)
\ No newline at end of file
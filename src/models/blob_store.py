@@ -0,0 +1,253 @@
+# src/models/blob_store.py
+"""Хранилище изображений ячеек, адресуемое по содержимому.
+
+Изображение загружается в таблицу blobs один раз, ключ — SHA-256 байтов,
+поэтому одинаковые картинки хранятся в одном экземпляре. В ячейке вместо
+пути остаётся ссылка "blob:<sha256>". Загружаются только файлы, которые по
+сигнатуре являются изображениями и не больше BLOB_MAX_BYTES. Миниатюры для сетки строятся один
+раз и кэшируются в таблице blob_thumbnails; для этого нужен Pillow (extra
+"images"), без него вместо изображения показывается заглушка.
+"""
+import base64
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+from src.models.connection import ConnectionManager
+from src.utils.constants import BLOB_MAX_BYTES, THUMBNAIL_MAX_SIDE
+from src.utils.logging_config import get_logger
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow необязателен: без него миниатюры не строятся
+    Image = None
+
+logger = get_logger("db.blobs")
+
+_pillow_warning_lock = threading.Lock()
+_pillow_warned = False
+
+
+def _warn_no_pillow():
+    """Сообщает об отсутствии Pillow один раз за процесс, а не на каждую картинку."""
+    global _pillow_warned
+    with _pillow_warning_lock:
+        if _pillow_warned:
+            return
+        _pillow_warned = True
+    logger.warning("Pillow не установлен: миниатюры изображений недоступны (pip install Pillow)")
+
+BLOB_REF_PREFIX = "blob:"
+DEFAULT_MIME = "application/octet-stream"
+_BLOB_REF_RE = re.compile(r"blob:([0-9a-f]{64})")
+
+# Сигнатуры поддерживаемых форматов: (смещение, байты, MIME)
+_IMAGE_SIGNATURES = (
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"BM", "image/bmp"),
+    (8, b"WEBP", "image/webp"),
+)
+
+
+def sniff_image_mime(data: bytes) -> Optional[str]:
+    """MIME изображения по первым байтам или None, если это не поддерживаемый формат."""
+    for offset, signature, mime in _IMAGE_SIGNATURES:
+        if data[offset:offset + len(signature)] == signature:
+            if mime == "image/webp" and not data.startswith(b"RIFF"):
+                continue
+            return mime
+    return None
+
+
+def is_blob_ref(content: Optional[str]) -> bool:
+    return bool(content) and content.startswith(BLOB_REF_PREFIX)
+
+
+def blob_key(content: str) -> str:
+    """SHA-256 из ссылки "blob:<sha256>"."""
+    return content[len(BLOB_REF_PREFIX):]
+
+
+def blob_refs(text: Optional[str]) -> Set[str]:
+    """SHA-256 всех ссылок blob: в закодированном содержимом ячеек (rich_content)."""
+    return set(_BLOB_REF_RE.findall(text or ""))
+
+
+def _local_path(content: str) -> Optional[str]:
+    """Путь к локальному файлу из содержимого ячейки или None (URL, пустая строка)."""
+    path = (content or "").strip()
+    if path.startswith("file://"):
+        path = path[len("file://"):]
+    if not path or "://" in path:
+        return None
+    path = os.path.expanduser(path)
+    return path if os.path.isfile(path) else None
+
+
+class BlobStore:
+    """Изображения в той же базе SQLite, что и сниппеты.
+
+    Все записи идут через писателя ConnectionManager, поэтому ingest внутри
+    транзакции Database коммитится вместе со сниппетом.
+    """
+
+    def __init__(self, connections: ConnectionManager, thumbnail_cache_size: int = 128,
+                 max_bytes: int = BLOB_MAX_BYTES):
+        self.connections = connections
+        self.max_bytes = max_bytes
+        self.thumbnail_cache_size = thumbnail_cache_size
+        self._thumbnails: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def create_tables(cursor: sqlite3.Cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                mime TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS blob_thumbnails (
+                sha256 TEXT NOT NULL,
+                max_side INTEGER NOT NULL,
+                mime TEXT NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (sha256, max_side)
+            )
+        """)
+
+    def put(self, data: bytes, mime: str = DEFAULT_MIME) -> str:
+        """Сохраняет байты, возвращает их SHA-256. Повторная загрузка тех же байтов ничего не пишет."""
+        key = hashlib.sha256(data).hexdigest()
+        with self.connections.writer() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO blobs (sha256, mime, size, data) VALUES (?, ?, ?, ?)",
+                (key, mime, len(data), sqlite3.Binary(data))
+            )
+        return key
+
+    def ingest_file(self, path: str) -> str:
+        """Загружает файл изображения; ValueError, если файл больше max_bytes или не изображение."""
+        with open(path, "rb") as f:
+            data = f.read(self.max_bytes + 1)
+        if len(data) > self.max_bytes:
+            raise ValueError(f"файл больше {self.max_bytes} байт")
+        mime = sniff_image_mime(data)
+        if mime is None:
+            raise ValueError("файл не является изображением")
+        key = self.put(data, mime)
+        logger.debug("Изображение %s сохранено как %s (%s байт)", path, key, len(data))
+        return key
+
+    def restore(self, key: str, data: bytes) -> bool:
+        """Загружает байты из резервной копии под ключом key, если это изображение с тем же SHA-256."""
+        mime = sniff_image_mime(data)
+        if len(data) > self.max_bytes or mime is None:
+            logger.warning("Изображение %s из резервной копии пропущено: не изображение или слишком большое", key)
+            return False
+        if hashlib.sha256(data).hexdigest() != key:
+            logger.warning("Изображение %s из резервной копии пропущено: хэш не совпадает", key)
+            return False
+        self.put(data, mime)
+        return True
+
+    def delete(self, keys: Iterable[str]):
+        """Удаляет изображения вместе с миниатюрами; ссылки на них проверяет вызывающий код."""
+        keys = [(key,) for key in keys]
+        with self.connections.writer() as conn:
+            conn.executemany("DELETE FROM blob_thumbnails WHERE sha256 = ?", keys)
+            conn.executemany("DELETE FROM blobs WHERE sha256 = ?", keys)
+        removed = {key for key, in keys}
+        with self._lock:
+            for cache_key in [k for k in self._thumbnails if k[0] in removed]:
+                del self._thumbnails[cache_key]
+        logger.debug("Удалено %s неиспользуемых изображений", len(keys))
+
+    def ingest_cells(self, cells: Iterable[Dict]) -> List[Dict]:
+        """Копия ячеек, где пути к локальным изображениям заменены ссылками blob:<sha256>.
+
+        Вызывается только для ячеек из редактора: пути в импортируемых файлах
+        не читаются. URL и уже загруженные ссылки не трогаются; нечитаемый,
+        слишком большой или не являющийся изображением файл остаётся путём.
+        """
+        result = []
+        for cell in cells:
+            if cell.get("type") == "image" and not is_blob_ref(cell.get("content")):
+                path = _local_path(cell.get("content"))
+                if path:
+                    try:
+                        cell = {**cell, "content": BLOB_REF_PREFIX + self.ingest_file(path)}
+                    except (OSError, ValueError) as e:
+                        logger.warning("Не удалось загрузить изображение %s: %s", path, e)
+            result.append(cell)
+        return result
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.connections.reader() as conn:
+            row = conn.execute("SELECT data FROM blobs WHERE sha256 = ?", (key,)).fetchone()
+        return bytes(row[0]) if row else None
+
+    def thumbnail(self, key: str, max_side: int = THUMBNAIL_MAX_SIDE) -> Optional[bytes]:
+        """Миниатюра не больше max_side по длинной стороне; строится один раз и сохраняется.
+
+        Возвращает None, если изображения нет, его не удалось разобрать или
+        Pillow не установлен: оригинал в сетку не отдаётся.
+        """
+        with self.connections.reader() as conn:
+            row = conn.execute(
+                "SELECT data FROM blob_thumbnails WHERE sha256 = ? AND max_side = ?", (key, max_side)
+            ).fetchone()
+        if row:
+            return bytes(row[0])
+
+        data = self.get(key)
+        if data is None:
+            return None
+        if Image is None:
+            _warn_no_pillow()
+            return None
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.thumbnail((max_side, max_side))
+                if image.mode not in ("RGB", "RGBA"):
+                    image = image.convert("RGBA")
+                out = io.BytesIO()
+                image.save(out, format="PNG", optimize=True)
+        except (OSError, ValueError) as e:
+            logger.warning("Не удалось построить миниатюру %s: %s", key, e)
+            return None
+        thumb = out.getvalue()
+        with self.connections.writer() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO blob_thumbnails (sha256, max_side, mime, data) VALUES (?, ?, ?, ?)",
+                (key, max_side, "image/png", sqlite3.Binary(thumb))
+            )
+        return thumb
+
+    def thumbnail_base64(self, key: str, max_side: int = THUMBNAIL_MAX_SIDE) -> Optional[str]:
+        """Миниатюра в base64 для ft.Image(src_base64=...), с LRU-кэшем в памяти."""
+        cache_key = (key, max_side)
+        with self._lock:
+            if cache_key in self._thumbnails:
+                self._thumbnails.move_to_end(cache_key)
+                return self._thumbnails[cache_key]
+        thumb = self.thumbnail(key, max_side)
+        if thumb is None:
+            return None
+        encoded = base64.b64encode(thumb).decode("ascii")
+        with self._lock:
+            self._thumbnails[cache_key] = encoded
+            while len(self._thumbnails) > self.thumbnail_cache_size:
+                self._thumbnails.popitem(last=False)
+        return encoded
@@ -0,0 +1,58 @@
+# src/models/cache.py
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class SnippetCache:
+    """Ограниченный LRU-кэш разобранных сниппетов по id.
+
+    Хранит сниппеты с уже декодированными ячейками. Наружу отдаются копии,
+    чтобы редакторы, меняющие словари ячеек на месте, не портили кэш.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[int, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _copy(snippet: Dict) -> Dict:
+        return {**snippet, "cells": [dict(cell) for cell in snippet["cells"]]}
+
+    def get(self, snippet_id: int, revision: Optional[int] = None) -> Optional[Dict]:
+        """Сниппет из кэша или None. Если передан revision, устаревшая запись считается промахом."""
+        with self._lock:
+            snippet = self._items.get(snippet_id)
+            if snippet is None or (revision is not None and snippet.get("revision") != revision):
+                self.misses += 1
+                return None
+            self._items.move_to_end(snippet_id)
+            self.hits += 1
+            return self._copy(snippet)
+
+    def put(self, snippet: Dict):
+        with self._lock:
+            self._items[snippet["id"]] = self._copy(snippet)
+            self._items.move_to_end(snippet["id"])
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, snippet_id: int):
+        with self._lock:
+            self._items.pop(snippet_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._items),
+                "maxsize": self.maxsize
+            }
@@ -0,0 +1,102 @@
+# src/models/codec.py
+"""Кодек содержимого ячеек сниппета.
+
+Ячейки хранятся в колонке rich_content, формат записан рядом в content_format.
+Новые записи кодируются в JSON; YAML остаётся форматом старых баз и буфера обмена.
+"""
+import json
+from collections.abc import Sequence
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import yaml
+
+FORMAT_YAML = "yaml"
+FORMAT_JSON = "json1"
+
+CURRENT_FORMAT = FORMAT_JSON
+SUPPORTED_FORMATS = (FORMAT_YAML, FORMAT_JSON)
+
+# C-ускоренный загрузчик PyYAML, если libyaml доступна
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class CodecError(ValueError):
+    """Содержимое не удалось разобрать в указанном формате."""
+
+
+def encode_cells(cells: Iterable[dict], content_format: str = CURRENT_FORMAT) -> Tuple[str, str]:
+    """Кодирует список ячеек, возвращает (формат, строка для rich_content)."""
+    cells = list(cells)
+    if content_format == FORMAT_JSON:
+        return FORMAT_JSON, json.dumps(cells, ensure_ascii=False, separators=(",", ":"))
+    if content_format == FORMAT_YAML:
+        return FORMAT_YAML, yaml.dump(cells, allow_unicode=True)
+    raise ValueError(f"Неизвестный формат содержимого: {content_format}")
+
+
+def decode_cells(raw: str, content_format: str = FORMAT_YAML) -> List[dict]:
+    """Декодирует rich_content в список ячеек. Пустое содержимое — пустой список."""
+    if not raw:
+        return []
+    try:
+        if content_format == FORMAT_JSON:
+            cells = json.loads(raw)
+        elif content_format == FORMAT_YAML:
+            cells = yaml.load(raw, Loader=_YamlLoader)
+        else:
+            raise CodecError(f"Неизвестный формат содержимого: {content_format}")
+    except (json.JSONDecodeError, yaml.YAMLError) as e:
+        raise CodecError(str(e)) from e
+
+    if not isinstance(cells, list):
+        raise CodecError(f"Ожидался список ячеек, получено {type(cells).__name__}")
+    return cells
+
+
+def cells_to_yaml(cells: Iterable[dict]) -> str:
+    """YAML-представление ячеек для копирования в буфер обмена."""
+    return yaml.dump(list(cells), allow_unicode=True)
+
+
+class LazyCells(Sequence):
+    """Список ячеек, который декодируется при первом обращении к элементам.
+
+    Длина известна заранее (колонка cell_count), поэтому len() и проверка
+    на пустоту не требуют разбора rich_content.
+    """
+
+    def __init__(self, loader: Callable[[], List[dict]], count: Optional[int] = None):
+        self._loader = loader
+        self._count = count
+        self._cells: Optional[List[dict]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._cells is not None
+
+    def _load(self) -> List[dict]:
+        if self._cells is None:
+            self._cells = self._loader()
+            self._loader = None
+        return self._cells
+
+    def __len__(self) -> int:
+        if self._cells is None and self._count is not None:
+            return self._count
+        return len(self._load())
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, LazyCells)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        if self._cells is None:
+            return f"LazyCells(<не загружено>, count={self._count})"
+        return f"LazyCells({self._cells!r})"
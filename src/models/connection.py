@@ -0,0 +1,103 @@
+# src/models/connection.py
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Union
+
+from src.utils.logging_config import get_logger
+
+logger = get_logger("db.connection")
+
+# Применяются к каждому соединению; journal_mode=WAL сохраняется в файле БД
+DEFAULT_PRAGMAS: Dict[str, Union[str, int]] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # в режиме WAL безопасно и без fsync на каждый коммит
+    "cache_size": -16000,  # ~16 МБ страничного кэша на соединение
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+class ConnectionManager:
+    """Соединения SQLite: один сериализованный писатель и пул читателей.
+
+    В режиме WAL читатели видят последний закоммиченный снимок и не ждут
+    коммита писателя. Все записи проходят через writer(), который держит
+    блокировку, поэтому потоки UI и фоновых задач не перемешивают транзакции.
+    """
+
+    def __init__(self, path: str, max_readers: int = 4, timeout: float = 30.0,
+                 pragmas: Dict[str, Union[str, int]] = None):
+        self.path = path
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._reader_slots = threading.BoundedSemaphore(max_readers)
+        self._all: List[sqlite3.Connection] = []
+        self._all_lock = threading.Lock()
+        self._closed = False
+        self._writer = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        with self._all_lock:
+            self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Соединение писателя под блокировкой: коммит при успехе, откат при исключении.
+
+        Вложенные вызовы в том же потоке выполняются в одной транзакции.
+        """
+        with self._write_lock:
+            self._write_depth += 1
+            try:
+                yield self._writer
+            except BaseException:
+                if self._write_depth == 1:
+                    self._writer.rollback()
+                raise
+            else:
+                if self._write_depth == 1:
+                    self._writer.commit()
+            finally:
+                self._write_depth -= 1
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Соединение из пула читателей на время блока."""
+        self._reader_slots.acquire()
+        try:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                # Закрываем неявную читающую транзакцию, чтобы не удерживать старый снимок WAL
+                if conn.in_transaction:
+                    conn.rollback()
+                if self._closed:
+                    conn.close()
+                else:
+                    self._readers.put(conn)
+        finally:
+            self._reader_slots.release()
+
+    def close(self):
+        logger.debug("Закрытие соединений с %s", self.path)
+        self._closed = True
+        with self._all_lock:
+            connections, self._all = self._all, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
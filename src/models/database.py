@@ -1,18 +1,51 @@
+import logging
 import sqlite3
 import os
+import re
+import threading
 from pathlib import Path
-from typing import List, Dict, Optional
-import yaml
-import traceback
+from typing import Iterable, Iterator, List, Dict, Optional, Set
 
-from src.utils.constants import SUPPORTED_LANGUAGES
+from src.models.blob_store import BLOB_REF_PREFIX, BlobStore, blob_refs
+from src.models.cache import SnippetCache
+from src.models.connection import ConnectionManager
+from src.models.embeddings import Embedder, EmbeddingIndex
+from src.models.explanation_cache import ExplanationCache, cell_content_hash
+from src.models.codec import CodecError, FORMAT_YAML, LazyCells, decode_cells, encode_cells
+from src.utils.constants import (
+    AI_EMBED_MODEL, PREVIEW_MAX_CHARS, PREVIEW_MAX_LINES, SEMANTIC_SEARCH_LIMIT, SNIPPETS_PAGE_SIZE, SUPPORTED_LANGUAGES
+)
+from src.utils.logging_config import get_logger
+
+logger = get_logger("db")
+
+SNIPPET_COLUMNS = "id, title, language, rich_content, tags, content_format, cell_count, revision, preview"
+HEADER_COLUMNS = "id, title, language, tags, cell_count"
+
+# Порядок значений совпадает с Database._row_values
+INSERT_SNIPPET_SQL = """
+    INSERT INTO snippets (title, language, rich_content, tags, content_format, cell_count,
+        search_text, search_body, preview)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+UPDATE_SNIPPET_SQL = """
+    UPDATE snippets SET title = ?, language = ?, rich_content = ?, tags = ?, content_format = ?,
+        cell_count = ?, search_text = ?, search_body = ?, preview = ?, revision = revision + 1
+    WHERE id = ?
+"""
+ON_DUPLICATE_MODES = ("insert", "skip", "update")
+# Строки, которые нужно перекодировать из YAML или у которых не заполнены вычисляемые колонки
+LEGACY_ROW_CONDITION = (
+    "content_format = ? OR search_body IS NULL OR cell_count IS NULL OR preview IS NULL"
+)
 
 
 class Database:
     """Класс для работы с операциями базы данных SQLite."""
 
-    def __init__(self, db_name: str = "snippets.db"):
-        print("DEBUG: Инициализация Database")
+    def __init__(self, db_name: str = "snippets.db", cache_size: int = 256,
+                 embedder: Optional[Embedder] = None, embed_model: str = AI_EMBED_MODEL):
+        logger.debug("Инициализация Database")
         current_dir = Path(os.getcwd())
         src_dir = current_dir / "src" if current_dir.name != "src" else current_dir
         db_path = src_dir / db_name
@@ -20,210 +53,761 @@ class Database:
         db_path.parent.mkdir(exist_ok=True)
 
         self.db_name = str(db_path)
-        print(f"DEBUG: Путь к базе данных: {self.db_name}")
+        self.fts_enabled = False
+        self.cache = SnippetCache(cache_size)
+        logger.debug("Путь к базе данных: %s", self.db_name)
 
         # Проверяем на повреждение и пересоздаём если нужно
         try:
-            self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
-            self.cursor = self.conn.cursor()
+            self.connections = ConnectionManager(self.db_name)
             self.create_table()
         except sqlite3.DatabaseError as e:
-            print(f"DEBUG: База данных повреждена: {e}. Пересоздание файла.")
-            os.remove(self.db_name)  # Удаляем повреждённый файл
-            self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
-            self.cursor = self.conn.cursor()
+            logger.warning("База данных повреждена: %s. Пересоздание файла.", e)
+            if getattr(self, "connections", None):
+                self.connections.close()
+            # Удаляем повреждённый файл вместе с журналом WAL
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.db_name + suffix):
+                    os.remove(self.db_name + suffix)
+            self.connections = ConnectionManager(self.db_name)
             self.create_table()
+        self.blobs = BlobStore(self.connections)
+        self.explanations = ExplanationCache(self.connections)
+        self.embeddings = EmbeddingIndex(self.connections, embedder=embedder, model=embed_model)
 
     def create_table(self):
         """Создание таблицы snippets с rich_content для многоячеечных сниппетов."""
-        print("DEBUG: Создание таблицы если не существует")
+        logger.debug("Создание таблицы если не существует")
         try:
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS snippets (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT NOT NULL,
-                    language TEXT NOT NULL,
-                    rich_content TEXT NOT NULL,
-                    tags TEXT DEFAULT ''
-                )
-            """)
-            self.conn.commit()
-            print("DEBUG: Таблица создана или уже существует")
+            with self.connections.writer() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS snippets (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        title TEXT NOT NULL,
+                        language TEXT NOT NULL,
+                        rich_content TEXT NOT NULL,
+                        tags TEXT DEFAULT ''
+                    )
+                """)
+                self._migrate_schema(cursor)
+                BlobStore.create_tables(cursor)
+                ExplanationCache.create_tables(cursor)
+                EmbeddingIndex.create_tables(cursor)
+                # Позиция прерванного импорта из файла, см. export_import.import_snippets_file
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS import_checkpoints (
+                        source TEXT PRIMARY KEY,
+                        fingerprint TEXT NOT NULL,
+                        byte_offset INTEGER NOT NULL DEFAULT 0,
+                        records INTEGER NOT NULL DEFAULT 0,
+                        inserted INTEGER NOT NULL DEFAULT 0,
+                        updated INTEGER NOT NULL DEFAULT 0,
+                        skipped INTEGER NOT NULL DEFAULT 0
+                    )
+                """)
+            logger.debug("Таблица создана или уже существует")
         except Exception as e:
-            print(f"DEBUG: Ошибка создания таблицы: {e}")
-            traceback.print_exc()
+            logger.exception("Ошибка создания таблицы: %s", e)
             raise
 
+    def _migrate_schema(self, cursor: sqlite3.Cursor):
+        """Добавление служебных колонок и индексов в существующую таблицу."""
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(snippets)")}
+
+        if "content_format" not in columns:
+            # Все строки, записанные до появления колонки, хранят ячейки в YAML
+            logger.debug("Добавление колонки content_format")
+            cursor.execute(
+                f"ALTER TABLE snippets ADD COLUMN content_format TEXT NOT NULL DEFAULT '{FORMAT_YAML}'"
+            )
+
+        if "search_text" not in columns:
+            logger.debug("Добавление колонки search_text")
+            cursor.execute("ALTER TABLE snippets ADD COLUMN search_text TEXT NOT NULL DEFAULT ''")
+            rows = cursor.execute("SELECT id, title, language, tags FROM snippets").fetchall()
+            cursor.executemany(
+                "UPDATE snippets SET search_text = ? WHERE id = ?",
+                [(self._build_search_text(row[1], row[2], row[3]), row[0]) for row in rows]
+            )
+            logger.debug("search_text заполнен для %s сниппетов", len(rows))
+
+        # Колонки, вычисляемые из ячеек, добавляются пустыми (NULL): разбор каждой строки
+        # выполняет фоновая migrate_legacy_content, а не запуск приложения
+        if "search_body" not in columns:
+            logger.debug("Добавление колонки search_body")
+            cursor.execute("ALTER TABLE snippets ADD COLUMN search_body TEXT")
+
+        if "cell_count" not in columns:
+            logger.debug("Добавление колонки cell_count")
+            cursor.execute("ALTER TABLE snippets ADD COLUMN cell_count INTEGER")
+
+        if "revision" not in columns:
+            # Счётчик изменений: UI сравнивает его, чтобы не пересобирать неизменённые карточки
+            logger.debug("Добавление колонки revision")
+            cursor.execute("ALTER TABLE snippets ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+
+        if "preview" not in columns:
+            logger.debug("Добавление колонки preview")
+            cursor.execute("ALTER TABLE snippets ADD COLUMN preview TEXT")
+
+        self._create_fts(cursor)
+
+        # Покрывающий индекс: поиск сканирует только его, не читая rich_content
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_snippets_search ON snippets(search_text, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_snippets_title ON snippets(title)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_snippets_format ON snippets(content_format)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_snippets_language ON snippets(language COLLATE NOCASE)"
+        )
+
+    def _create_fts(self, cursor: sqlite3.Cursor):
+        """Полнотекстовый индекс FTS5 по названию, тегам и тексту ячеек.
+
+        Таблица хранит только индекс (external content) и синхронизируется
+        со snippets триггерами. Если SQLite собран без FTS5, поиск работает
+        только по search_text.
+        """
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'snippets_fts'"
+        ).fetchone()
+        try:
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS snippets_fts USING fts5(
+                    title, tags, search_body,
+                    content='snippets', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            logger.warning("FTS5 недоступен: %s, полнотекстовый поиск отключён", e)
+            return
+
+        cursor.executescript("""
+            CREATE TRIGGER IF NOT EXISTS snippets_fts_ai AFTER INSERT ON snippets BEGIN
+                INSERT INTO snippets_fts(rowid, title, tags, search_body)
+                VALUES (new.id, new.title, new.tags, new.search_body);
+            END;
+            CREATE TRIGGER IF NOT EXISTS snippets_fts_ad AFTER DELETE ON snippets BEGIN
+                INSERT INTO snippets_fts(snippets_fts, rowid, title, tags, search_body)
+                VALUES ('delete', old.id, old.title, old.tags, old.search_body);
+            END;
+            CREATE TRIGGER IF NOT EXISTS snippets_fts_au AFTER UPDATE OF title, tags, search_body ON snippets BEGIN
+                INSERT INTO snippets_fts(snippets_fts, rowid, title, tags, search_body)
+                VALUES ('delete', old.id, old.title, old.tags, old.search_body);
+                INSERT INTO snippets_fts(rowid, title, tags, search_body)
+                VALUES (new.id, new.title, new.tags, new.search_body);
+            END;
+        """)
+        if not exists:
+            logger.debug("Построение полнотекстового индекса")
+            cursor.execute("INSERT INTO snippets_fts(snippets_fts) VALUES ('rebuild')")
+        self.fts_enabled = True
+
+    @staticmethod
+    def _build_search_text(title: str, language: str, tags: str) -> str:
+        """Нормализованная строка для регистронезависимого поиска (включая кириллицу)."""
+        return "\n".join(part or "" for part in (title, language, tags)).lower()
+
+    @staticmethod
+    def _build_search_body(cells: list) -> str:
+        """Текст всех ячеек (кроме изображений) для полнотекстового индекса."""
+        return "\n".join(
+            str(cell.get("content") or "") for cell in cells if cell.get("type", "code") != "image"
+        )
+
+    @staticmethod
+    def _build_preview(cells: list, language: str) -> str:
+        """Markdown для карточки сетки: первые строки первой кодовой или текстовой ячейки.
+
+        Пустая строка, если таких ячеек нет — тогда карточка рисует ячейки целиком.
+        """
+        for cell in cells:
+            cell_type = cell.get("type", "code")
+            if cell_type not in ("code", "text", "markdown"):
+                continue
+            lines = str(cell.get("content") or "").splitlines()
+            text = "\n".join(lines[:PREVIEW_MAX_LINES])
+            truncated = len(lines) > PREVIEW_MAX_LINES or len(text) > PREVIEW_MAX_CHARS
+            text = text[:PREVIEW_MAX_CHARS]
+            if cell_type == "code":
+                if truncated:
+                    text += "\n…"
+                return f"```{cell.get('language') or language}\n{text}\n```"
+            return text + ("…" if truncated else "")
+        return ""
+
+    @staticmethod
+    def _fts_query(search_query: str) -> Optional[str]:
+        """Запрос FTS5: каждое слово ищется как префикс, спецсимволы синтаксиса экранируются."""
+        tokens = re.findall(r"\w+", search_query)
+        if not tokens:
+            return None
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    @staticmethod
+    def _like_pattern(search_query: str) -> str:
+        """Шаблон LIKE для поиска подстроки с экранированием спецсимволов."""
+        escaped = search_query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return f"%{escaped}%"
+
+    def _decode_cells(self, row) -> list:
+        """Разбор содержимого строки (id, title, language, rich_content, tags, content_format)."""
+        content_format = row[5] if len(row) > 5 else FORMAT_YAML
+        try:
+            cells = decode_cells(row[3], content_format)
+            logger.debug("Загружено %s ячеек для сниппета ID %s", len(cells), row[0])
+        except CodecError as codec_err:
+            logger.warning(
+                "Ошибка разбора %s для сниппета ID %s: %s, использование fallback", content_format, row[0], codec_err
+            )
+            cells = [{"type": "code", "language": row[2], "content": row[3]}]
+        return cells
+
+    def _lazy_cells(self, row) -> LazyCells:
+        """Ячейки строки, которые будут разобраны только при первом обращении."""
+        return LazyCells(lambda: self._cached_cells(row), row[6])
+
+    def _cached_cells(self, row) -> list:
+        """Ячейки из кэша, если там та же ревизия; иначе разбор строки с записью в кэш."""
+        cached = self.cache.get(row[0], revision=row[7])
+        if cached:
+            return cached["cells"]
+        snippet = self._row_to_snippet(row)
+        self.cache.put(snippet)
+        return snippet["cells"]
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Счётчики попаданий/промахов кэша сниппетов."""
+        return self.cache.stats()
+
+    def _row_to_snippet(self, row, lazy: bool = False) -> Dict:
+        return {
+            "id": row[0],
+            "title": row[1],
+            "language": row[2],
+            "cells": self._lazy_cells(row) if lazy else self._decode_cells(row),
+            "tags": row[4],
+            "revision": row[7],
+            "preview": row[8]
+        }
+
+    def migrate_legacy_content(self, batch_size: int = 200) -> int:
+        """Приводит старые строки к текущей схеме, возвращает число обновлённых строк.
+
+        Строки в YAML перекодируются в текущий формат, у строк без search_body,
+        cell_count или preview эти колонки заполняются. Каждая строка
+        разбирается один раз. Коммитит пачками и занимает писателя только на
+        время пачки, поэтому может выполняться в фоне. Строки с повреждённым
+        YAML остаются в YAML, вычисляемые колонки для них строятся по fallback.
+        """
+        logger.debug("Запуск миграции старых строк")
+        migrated = 0
+        last_id = 0
+        while True:
+            with self.connections.reader() as conn:
+                rows = conn.execute(
+                    f"SELECT {SNIPPET_COLUMNS} FROM snippets WHERE ({LEGACY_ROW_CONDITION}) AND id > ? "
+                    "ORDER BY id LIMIT ?",
+                    (FORMAT_YAML, last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            updates = []
+            for row in rows:
+                content_format, raw = row[5], row[3]
+                try:
+                    cells = decode_cells(raw, content_format)
+                    if content_format == FORMAT_YAML:
+                        content_format, raw = encode_cells(cells)
+                except CodecError as codec_err:
+                    logger.warning("Содержимое сниппета ID %s не перекодировано: %s", row[0], codec_err)
+                    cells = self._decode_cells(row)
+                updates.append((raw, content_format, self._build_search_body(cells), len(cells),
+                                self._build_preview(cells, row[2]), row[0], row[3]))
+
+            # Писатель занят только на время одной пачки. Условие на старое содержимое
+            # защищает от перезаписи параллельного update_snippet
+            with self.connections.writer() as conn:
+                conn.executemany(
+                    "UPDATE snippets SET rich_content = ?, content_format = ?, search_body = ?, cell_count = ?, "
+                    "preview = ? WHERE id = ? AND rich_content = ?",
+                    updates
+                )
+            migrated += len(updates)
+            logger.debug("Мигрировано %s сниппетов", migrated)
+        return migrated
+
+    def start_content_migration(self) -> Optional[threading.Thread]:
+        """Запускает migrate_legacy_content в фоновом потоке, если есть строки старой схемы."""
+        with self.connections.reader() as conn:
+            pending = conn.execute(
+                f"SELECT 1 FROM snippets WHERE {LEGACY_ROW_CONDITION} LIMIT 1", (FORMAT_YAML,)
+            ).fetchone()
+        if not pending:
+            return None
+        thread = threading.Thread(target=self.migrate_legacy_content, daemon=True)
+        thread.start()
+        return thread
+
+    def _row_values(self, title: str, language: str, cells: Iterable[dict], tags: str = "") -> tuple:
+        """Значения колонок для INSERT_SNIPPET_SQL/UPDATE_SNIPPET_SQL: кодирование ячеек и поисковые поля."""
+        cells = list(cells)
+        if language not in SUPPORTED_LANGUAGES:
+            language = "markdown"
+        tags = tags or ""
+        content_format, raw_content = encode_cells(cells)
+        return (title, language, raw_content, tags, content_format, len(cells),
+                self._build_search_text(title, language, tags), self._build_search_body(cells),
+                self._build_preview(cells, language))
+
     def add_snippet(self, title: str, language: str, cells: list, tags: str = "") -> int:
         """Добавление нового сниппета с многоячеечным содержимым."""
-        print(f"DEBUG: Вызов add_snippet - title: {title}, language: {language}, tags: {tags}")
-        print(f"DEBUG: Количество ячеек для добавления: {len(cells)}")
+        logger.debug("Вызов add_snippet - title: %s, language: %s, tags: %s", title, language, tags)
+        logger.debug("Количество ячеек для добавления: %s", len(cells))
         if language not in SUPPORTED_LANGUAGES:
-            print(f"DEBUG: Неподдерживаемый язык '{language}', используется 'markdown' по умолчанию")
+            logger.debug("Неподдерживаемый язык '%s', используется 'markdown' по умолчанию", language)
             language = "markdown"  # или raise ValueError, но мягче — fallback
-        for i, cell in enumerate(cells):
-            print(f"DEBUG: Ячейка {i}: {cell.get('type', 'unknown')} - {len(cell.get('content', ''))} символов")
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, cell in enumerate(cells):
+                logger.debug("Ячейка %s: %s - %s символов", i, cell.get('type', 'unknown'), len(cell.get('content', '')))
 
         try:
-            yaml_content = yaml.dump(cells, allow_unicode=True)
-            print(f"DEBUG: Длина YAML-контента: {len(yaml_content)}")
-
-            self.cursor.execute(
-                "INSERT INTO snippets (title, language, rich_content, tags) VALUES (?, ?, ?, ?)",
-                (title, language, yaml_content, tags)
-            )
-            self.conn.commit()
-            result = self.cursor.lastrowid
-            print(f"DEBUG: Сниппет добавлен успешно, ID: {result}")
+            # Изображения загружаются в той же транзакции, иначе сборка мусора
+            # может удалить их до вставки ссылающегося сниппета
+            with self.connections.writer() as conn:
+                cells = self.blobs.ingest_cells(cells)
+                values = self._row_values(title, language, cells, tags)
+                logger.debug("Длина контента (%s): %s", values[4], len(values[2]))
+                cursor = conn.execute(INSERT_SNIPPET_SQL, values)
+            result = cursor.lastrowid
+            self.cache.put({
+                "id": result, "title": title, "language": language, "cells": cells, "tags": tags, "revision": 0,
+                "preview": values[8]
+            })
+            logger.debug("Сниппет добавлен успешно, ID: %s", result)
             return result
         except Exception as e:
-            print(f"DEBUG: Ошибка в add_snippet: {e}")
-            traceback.print_exc()
+            logger.exception("Ошибка в add_snippet: %s", e)
             raise
 
+    def _search_filter(self, search_query: str):
+        """Условие WHERE и параметры для поиска подстроки/слов; (None, []) для пустого запроса."""
+        clean_query = (search_query or "").strip().lower()
+        if not clean_query:
+            return None, []
+
+        # Фильтрация на стороне SQLite: подзапрос сканирует только индекс idx_snippets_search,
+        # а rich_content читается лишь для совпавших строк. Содержимое ячеек ищется через FTS5.
+        logger.debug("Фильтрация по запросу: '%s'", clean_query)
+        conditions = ["id IN (SELECT id FROM snippets WHERE search_text LIKE ? ESCAPE '\\')"]
+        params = [self._like_pattern(clean_query)]
+        fts_query = self._fts_query(clean_query) if self.fts_enabled else None
+        if fts_query:
+            conditions.append("id IN (SELECT rowid FROM snippets_fts WHERE snippets_fts MATCH ?)")
+            params.append(fts_query)
+        return " OR ".join(conditions), params
+
     def get_snippets(self, search_query: str = "") -> List[Dict]:
-        """Получение всех сниппетов, опционально с фильтром по поисковому запросу."""
-        print(f"DEBUG: Вызов get_snippets с запросом: '{search_query}'")
+        """Получение всех сниппетов, опционально с фильтром по поисковому запросу.
 
-        # Сначала получаем ВСЕ сниппеты
-        self.cursor.execute(
-            "SELECT id, title, language, rich_content, tags FROM snippets ORDER BY id DESC"
-        )
-        rows = self.cursor.fetchall()
-        print(f"DEBUG: Всего строк в базе: {len(rows)}")
+        Ячейки возвращаются как LazyCells и разбираются только при обращении.
+        """
+        logger.debug("Вызов get_snippets с запросом: '%s'", search_query)
 
-        # Если запрос пустой, возвращаем все сниппеты
-        if not search_query or not search_query.strip():
-            snippets = []
-            for row in rows:
-                try:
-                    cells = yaml.safe_load(row[3]) if row[3] else []
-                    print(f"DEBUG: Загружено {len(cells)} ячеек для сниппета ID {row[0]}")
-                except yaml.YAMLError as yaml_err:
-                    print(f"DEBUG: Ошибка парсинга YAML для сниппета ID {row[0]}: {yaml_err}, использование fallback")
-                    cells = [{"type": "code", "language": row[2], "content": row[3]}]
-
-                snippets.append({
-                    "id": row[0],
-                    "title": row[1],
-                    "language": row[2],
-                    "cells": cells,
-                    "tags": row[4]
-                })
-
-            print(f"DEBUG: Возвращаю {len(snippets)} сниппетов (все)")
-            return snippets
-
-        # Если есть поисковый запрос - фильтруем на уровне Python
-        clean_query = search_query.strip().lower()
-        print(f"DEBUG: Фильтрация по запросу: '{clean_query}'")
-
-        snippets = []
-        for row in rows:
-            title = row[1] or ""
-            language = row[2] or ""
-            tags = row[4] or ""
+        where, params = self._search_filter(search_query)
+        with self.connections.reader() as conn:
+            rows = conn.execute(
+                f"SELECT {SNIPPET_COLUMNS} FROM snippets {'WHERE ' + where if where else ''} ORDER BY id DESC",
+                params
+            ).fetchall()
+        snippets = [self._row_to_snippet(row, lazy=True) for row in rows]
 
-            # Регистронезависимый поиск на уровне Python
-            if (clean_query in title.lower() or
-                    clean_query in language.lower() or
-                    clean_query in tags.lower()):
+        logger.debug("Возвращаю %s сниппетов", len(snippets))
+        return snippets
 
-                try:
-                    cells = yaml.safe_load(row[3]) if row[3] else []
-                    print(f"DEBUG: Загружено {len(cells)} ячеек для сниппета ID {row[0]}")
-                except yaml.YAMLError as yaml_err:
-                    print(f"DEBUG: Ошибка парсинга YAML для сниппета ID {row[0]}: {yaml_err}, использование fallback")
-                    cells = [{"type": "code", "language": row[2], "content": row[3]}]
-
-                snippets.append({
-                    "id": row[0],
-                    "title": row[1],
-                    "language": row[2],
-                    "cells": cells,
-                    "tags": row[4]
-                })
-
-        print(f"DEBUG: Возвращаю {len(snippets)} сниппетов после фильтрации")
+    def get_snippets_page(self, search_query: str = "", after_id: Optional[int] = None,
+                          limit: int = SNIPPETS_PAGE_SIZE) -> List[Dict]:
+        """Страница сниппетов в порядке id DESC (keyset-пагинация).
+
+        after_id — id последнего сниппета предыдущей страницы; None для первой.
+        Если вернулось меньше limit записей, страниц больше нет.
+        """
+        logger.debug("Вызов get_snippets_page: запрос '%s', after_id=%s, limit=%s", search_query, after_id, limit)
+
+        where, params = self._search_filter(search_query)
+        conditions = [f"({where})"] if where else []
+        if after_id is not None:
+            conditions.append("id < ?")
+            params.append(after_id)
+        with self.connections.reader() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT {SNIPPET_COLUMNS} FROM snippets
+                {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+                ORDER BY id DESC
+                LIMIT ?
+                """,
+                params + [limit]
+            ).fetchall()
+        snippets = [self._row_to_snippet(row, lazy=True) for row in rows]
+
+        logger.debug("Возвращаю страницу из %s сниппетов", len(snippets))
         return snippets
 
+    def get_snippet_headers(self, search_query: str = "") -> List[Dict]:
+        """Лёгкий список сниппетов без содержимого: id, title, language, tags, cell_count."""
+        logger.debug("Вызов get_snippet_headers с запросом: '%s'", search_query)
+
+        where, params = self._search_filter(search_query)
+        with self.connections.reader() as conn:
+            rows = conn.execute(
+                f"SELECT {HEADER_COLUMNS} FROM snippets {'WHERE ' + where if where else ''} ORDER BY id DESC",
+                params
+            ).fetchall()
+        headers = [
+            {"id": row[0], "title": row[1], "language": row[2], "tags": row[3], "cell_count": row[4]}
+            for row in rows
+        ]
+
+        logger.debug("Возвращаю %s заголовков", len(headers))
+        return headers
+
+    def count_snippets(self) -> int:
+        """Общее число сниппетов в базе."""
+        with self.connections.reader() as conn:
+            return conn.execute("SELECT COUNT(*) FROM snippets").fetchone()[0]
+
+    def iter_snippets(self, batch_size: int = 200) -> Iterator[Dict]:
+        """Потоково отдаёт все сниппеты по возрастанию id, читая курсор порциями по batch_size.
+
+        Ячейки декодируются по одному сниппету и мимо кэша, поэтому память не
+        растёт с размером библиотеки. Всё чтение идёт из одного снимка WAL.
+        """
+        with self.connections.reader() as conn:
+            cursor = conn.execute(f"SELECT {SNIPPET_COLUMNS} FROM snippets ORDER BY id")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._row_to_snippet(row)
+
+    def search_snippets(self, search_query: str, limit: int = 50) -> List[Dict]:
+        """Полнотекстовый поиск по названию, тегам и ячейкам с ранжированием BM25.
+
+        Помимо полей сниппета возвращает rank (меньше — релевантнее),
+        title_highlight и excerpt с совпадениями, выделенными **жирным**.
+
+        Сетка главного экрана этот метод не использует: она листает
+        get_snippets_page по id, где FTS служит только фильтром вместе с
+        подстрочным поиском по названию, языку и тегам. Ранжирование и
+        подсветка доступны вызывающему коду через API.
+        """
+        logger.debug("Вызов search_snippets с запросом: '%s'", search_query)
+        fts_query = self._fts_query(search_query or "")
+        if not self.fts_enabled or not fts_query:
+            return []
+
+        # Веса колонок BM25: title важнее tags, tags важнее содержимого ячеек
+        with self.connections.reader() as conn:
+            rows = conn.execute(
+                """
+                SELECT s.id, s.title, s.language, s.rich_content, s.tags, s.content_format, s.cell_count, s.revision,
+                       s.preview,
+                       bm25(snippets_fts, 10.0, 5.0, 1.0) AS rank,
+                       highlight(snippets_fts, 0, '**', '**'),
+                       snippet(snippets_fts, 2, '**', '**', '…', 16)
+                FROM snippets_fts
+                JOIN snippets s ON s.id = snippets_fts.rowid
+                WHERE snippets_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+                """,
+                (fts_query, limit)
+            ).fetchall()
+        results = []
+        for row in rows:
+            snippet = self._row_to_snippet(row, lazy=True)
+            snippet.update(rank=row[9], title_highlight=row[10], excerpt=row[11])
+            results.append(snippet)
+        logger.debug("Найдено %s сниппетов в полнотекстовом индексе", len(results))
+        return results
+
+    def semantic_search(self, search_query: str, limit: int = SEMANTIC_SEARCH_LIMIT) -> List[Dict]:
+        """Сниппеты, близкие к запросу по смыслу, по убыванию score (косинусная близость эмбеддингов).
+
+        Перед поиском досчитываются эмбеддинги новых и изменённых сниппетов,
+        поэтому первый запрос по большой базе заметно дольше последующих.
+        Требует numpy; ошибки модели эмбеддингов (OllamaError) пробрасываются.
+        """
+        logger.debug("Вызов semantic_search с запросом: '%s'", search_query)
+        if not (search_query or "").strip():
+            return []
+        self.embeddings.refresh()
+        hits = self.embeddings.search(search_query, limit)
+        if not hits:
+            return []
+
+        placeholders = ", ".join("?" for _ in hits)
+        with self.connections.reader() as conn:
+            rows = conn.execute(
+                f"SELECT {SNIPPET_COLUMNS} FROM snippets WHERE id IN ({placeholders})",
+                [snippet_id for snippet_id, _ in hits]
+            ).fetchall()
+        rows_by_id = {row[0]: row for row in rows}
+        results = []
+        for snippet_id, score in hits:
+            row = rows_by_id.get(snippet_id)
+            if row is None:  # удалён после пересчёта индекса
+                continue
+            snippet = self._row_to_snippet(row, lazy=True)
+            snippet["score"] = score
+            results.append(snippet)
+        logger.debug("Найдено %s сниппетов семантическим поиском", len(results))
+        return results
 
     def get_snippet_by_id(self, snippet_id: int) -> Optional[Dict]:
         """Получение конкретного сниппета по ID."""
-        print(f"DEBUG: Вызов get_snippet_by_id для ID: {snippet_id}")
-        self.cursor.execute(
-            "SELECT id, title, language, rich_content, tags FROM snippets WHERE id = ?",
-            (snippet_id,)
-        )
-        row = self.cursor.fetchone()
+        logger.debug("Вызов get_snippet_by_id для ID: %s", snippet_id)
+        cached = self.cache.get(snippet_id)
+        if cached:
+            return cached
+        with self.connections.reader() as conn:
+            row = conn.execute(
+                f"SELECT {SNIPPET_COLUMNS} FROM snippets WHERE id = ?",
+                (snippet_id,)
+            ).fetchone()
         if row:
-            try:
-                cells = yaml.safe_load(row[3]) if row[3] else []
-                print(f"DEBUG: Загружен сниппет {snippet_id} с {len(cells)} ячейками")
-            except yaml.YAMLError as yaml_err:
-                print(f"DEBUG: Ошибка парсинга YAML для сниппета ID {snippet_id}: {yaml_err}, использование fallback")
-                cells = [{"type": "code", "language": row[2], "content": row[3]}]
-            return {
-                "id": row[0],
-                "title": row[1],
-                "language": row[2],
-                "cells": cells,
-                "tags": row[4]
-            }
-        print(f"DEBUG: Сниппет с ID {snippet_id} не найден")
+            snippet = self._row_to_snippet(row)
+            self.cache.put(snippet)
+            return snippet
+        logger.debug("Сниппет с ID %s не найден", snippet_id)
         return None
 
     def update_snippet(self, snippet_id: int, title: str, language: str, cells: list, tags: str = ""):
         """Обновление существующего сниппета."""
-        print(f"DEBUG: Вызов update_snippet для ID: {snippet_id}")
-        print(f"DEBUG: Обновление с title: {title}, language: {language}, tags: {tags}")
-        print(f"DEBUG: Количество ячеек для обновления: {len(cells)}")
+        logger.debug("Вызов update_snippet для ID: %s", snippet_id)
+        logger.debug("Обновление с title: %s, language: %s, tags: %s", title, language, tags)
+        logger.debug("Количество ячеек для обновления: %s", len(cells))
         if language not in SUPPORTED_LANGUAGES:
-            print(f"DEBUG: Неподдерживаемый язык '{language}' при обновлении, используется 'markdown'")
+            logger.debug("Неподдерживаемый язык '%s' при обновлении, используется 'markdown'", language)
             language = "markdown"
-        for i, cell in enumerate(cells):
-            print(f"DEBUG: Ячейка {i}: {cell.get('type', 'unknown')} - {len(cell.get('content', ''))} символов")
-
-        yaml_content = yaml.dump(cells, allow_unicode=True)
-        print(f"DEBUG: Длина YAML-контента: {len(yaml_content)}")
-        self.cursor.execute(
-            "UPDATE snippets SET title = ?, language = ?, rich_content = ?, tags = ? WHERE id = ?",
-            (title, language, yaml_content, tags, snippet_id)
-        )
-        self.conn.commit()
-        print(f"DEBUG: Сниппет {snippet_id} обновлён успешно")
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, cell in enumerate(cells):
+                logger.debug("Ячейка %s: %s - %s символов", i, cell.get('type', 'unknown'), len(cell.get('content', '')))
+
+        with self.connections.writer() as conn:
+            values = self._row_values(title, language, self.blobs.ingest_cells(cells), tags)
+            logger.debug("Длина контента (%s): %s", values[4], len(values[2]))
+            old_refs = self._blob_refs_of(conn, [snippet_id])
+            conn.execute(UPDATE_SNIPPET_SQL, values + (snippet_id,))
+            self._release_blobs(conn, old_refs)
+            # Объяснения неизменённых ячеек остаются, остальные (и объяснение всего сниппета) удаляются
+            self.explanations.invalidate_snippet(
+                snippet_id, {cell_content_hash(language, cell.get("content", "")) for cell in cells}
+            )
+        self.cache.invalidate(snippet_id)
+        logger.debug("Сниппет %s обновлён успешно", snippet_id)
+
+    @staticmethod
+    def _existing_title_ids(conn: sqlite3.Connection, titles: Iterable[str]) -> Dict[str, int]:
+        """Одним запросом находит, какие из titles уже есть в базе: {title: id последнего сниппета}."""
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS lookup_titles (title TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM lookup_titles")
+        conn.executemany("INSERT OR IGNORE INTO lookup_titles (title) VALUES (?)", ((t,) for t in titles))
+        rows = conn.execute(
+            "SELECT s.title, MAX(s.id) FROM snippets s JOIN lookup_titles t ON t.title = s.title GROUP BY s.title"
+        ).fetchall()
+        conn.execute("DELETE FROM lookup_titles")
+        return {row[0]: row[1] for row in rows}
+
+    def add_snippets_many(self, snippets: Iterable[Dict], on_duplicate: str = "insert") -> Dict[str, int]:
+        """Пакетная вставка сниппетов одной транзакцией.
+
+        snippets — словари с title, language, cells и tags. on_duplicate задаёт
+        поведение для названий, которые уже есть в базе или повторяются в пакете:
+        "insert" — вставлять всё, "skip" — пропускать, "update" — перезаписывать
+        существующий сниппет. Возвращает счётчики inserted/updated/skipped.
+        Пути в ячейках-изображениях сохраняются как есть: файлы с диска
+        загружаются только из редактора (add_snippet/update_snippet).
+        """
+        if on_duplicate not in ON_DUPLICATE_MODES:
+            raise ValueError(f"on_duplicate должен быть одним из {ON_DUPLICATE_MODES}")
+        snippets = list(snippets)
+        logger.debug("Вызов add_snippets_many: %s сниппетов, on_duplicate=%s", len(snippets), on_duplicate)
+
+        # Кодирование выполняется до захвата писателя, чтобы не держать блокировку на CPU-работе
+        rows = [
+            self._row_values(s["title"], s.get("language", "markdown"),
+                             s.get("cells", []), s.get("tags", ""))
+            for s in snippets
+        ]
+        counts = {"inserted": 0, "updated": 0, "skipped": 0}
+
+        with self.connections.writer() as conn:
+            if on_duplicate == "insert":
+                inserts, updates = rows, []
+            else:
+                existing = self._existing_title_ids(conn, (row[0] for row in rows))
+                inserts, updates, seen = [], {}, set()
+                for row in rows:
+                    title = row[0]
+                    if title in existing:
+                        if on_duplicate == "update":
+                            updates[existing[title]] = row  # последняя запись пакета побеждает
+                        else:
+                            counts["skipped"] += 1
+                    elif title in seen:
+                        counts["skipped"] += 1
+                    else:
+                        seen.add(title)
+                        inserts.append(row)
+                updates = [row + (snippet_id,) for snippet_id, row in updates.items()]
+
+            conn.executemany(INSERT_SNIPPET_SQL, inserts)
+            if updates:
+                old_refs = self._blob_refs_of(conn, [row[-1] for row in updates])
+                conn.executemany(UPDATE_SNIPPET_SQL, updates)
+                self._invalidate_explanations(conn, (row[-1] for row in updates))
+                self._release_blobs(conn, old_refs)
+        counts["inserted"] = len(inserts)
+        counts["updated"] = len(updates)
+
+        for row in updates:
+            self.cache.invalidate(row[-1])
+        logger.debug("add_snippets_many завершён: %s", counts)
+        return counts
+
+    @staticmethod
+    def _invalidate_explanations(conn: sqlite3.Connection, snippet_ids: Iterable[int]):
+        """Пакетные обновления сбрасывают все объяснения затронутых сниппетов, без сверки по ячейкам."""
+        conn.executemany("DELETE FROM ai_explanations WHERE snippet_id = ?", ((sid,) for sid in snippet_ids))
+
+    @staticmethod
+    def _blob_refs_of(conn: sqlite3.Connection, snippet_ids: List[int]) -> Set[str]:
+        """Изображения, на которые ссылаются сниппеты snippet_ids (до их изменения или удаления)."""
+        refs = set()
+        for start in range(0, len(snippet_ids), 500):
+            chunk = snippet_ids[start:start + 500]
+            rows = conn.execute(
+                f"SELECT rich_content FROM snippets WHERE id IN ({', '.join('?' for _ in chunk)}) "
+                "AND rich_content LIKE '%blob:%'",
+                chunk
+            ).fetchall()
+            for row in rows:
+                refs |= blob_refs(row[0])
+        return refs
+
+    def _release_blobs(self, conn: sqlite3.Connection, keys: Iterable[str]):
+        """Удаляет из keys изображения, на которые больше не ссылается ни один сниппет.
+
+        Вызывается внутри писателя после изменения сниппетов, поэтому
+        параллельная запись не увидит промежуточного состояния.
+        """
+        unused = [
+            key for key in keys
+            if not conn.execute(
+                "SELECT 1 FROM snippets WHERE rich_content LIKE ? LIMIT 1", (f"%{BLOB_REF_PREFIX}{key}%",)
+            ).fetchone()
+        ]
+        if unused:
+            self.blobs.delete(unused)
+
+    def collect_unused_blobs(self) -> int:
+        """Полная сборка мусора: удаляет все изображения без ссылок, возвращает их число.
+
+        Изменения через Database освобождают изображения сразу; этот проход
+        нужен для баз, где изображения остались от прежних версий.
+        """
+        with self.connections.writer() as conn:
+            referenced = set()
+            for row in conn.execute("SELECT rich_content FROM snippets WHERE rich_content LIKE '%blob:%'"):
+                referenced |= blob_refs(row[0])
+            unused = [row[0] for row in conn.execute("SELECT sha256 FROM blobs") if row[0] not in referenced]
+            if unused:
+                self.blobs.delete(unused)
+        return len(unused)
+
+    def update_many(self, snippets: Iterable[Dict]) -> int:
+        """Пакетное обновление сниппетов по id одной транзакцией, возвращает число обновлённых строк."""
+        updates = [
+            self._row_values(s["title"], s.get("language", "markdown"),
+                             s.get("cells", []), s.get("tags", ""))
+            + (s["id"],)
+            for s in snippets
+        ]
+        logger.debug("Вызов update_many: %s сниппетов", len(updates))
+        with self.connections.writer() as conn:
+            old_refs = self._blob_refs_of(conn, [row[-1] for row in updates])
+            cursor = conn.executemany(UPDATE_SNIPPET_SQL, updates)
+            self._invalidate_explanations(conn, (row[-1] for row in updates))
+            self._release_blobs(conn, old_refs)
+        for row in updates:
+            self.cache.invalidate(row[-1])
+        return cursor.rowcount
+
+    def transaction(self):
+        """Контекстный менеджер общей транзакции: записи внутри блока коммитятся вместе или откатываются."""
+        return self.connections.writer()
+
+    def get_import_checkpoint(self, source: str) -> Optional[Dict]:
+        with self.connections.reader() as conn:
+            row = conn.execute(
+                "SELECT fingerprint, byte_offset, records, inserted, updated, skipped "
+                "FROM import_checkpoints WHERE source = ?",
+                (source,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "fingerprint": row[0], "byte_offset": row[1], "records": row[2],
+            "inserted": row[3], "updated": row[4], "skipped": row[5]
+        }
+
+    def save_import_checkpoint(self, source: str, checkpoint: Dict):
+        """Сохраняет позицию импорта; вызывается в той же транзакции, что и запись пачки."""
+        with self.connections.writer() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO import_checkpoints "
+                "(source, fingerprint, byte_offset, records, inserted, updated, skipped) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source, checkpoint["fingerprint"], checkpoint["byte_offset"], checkpoint["records"],
+                 checkpoint["inserted"], checkpoint["updated"], checkpoint["skipped"])
+            )
+
+    def clear_import_checkpoint(self, source: str):
+        with self.connections.writer() as conn:
+            conn.execute("DELETE FROM import_checkpoints WHERE source = ?", (source,))
 
     def delete_snippet(self, snippet_id: int):
         """Удаление сниппета из базы данных."""
-        print(f"DEBUG: Вызов delete_snippet для ID: {snippet_id}")
-        self.cursor.execute("DELETE FROM snippets WHERE id = ?", (snippet_id,))
-        self.conn.commit()
-        print(f"DEBUG: Сниппет {snippet_id} удалён успешно")
+        logger.debug("Вызов delete_snippet для ID: %s", snippet_id)
+        with self.connections.writer() as conn:
+            old_refs = self._blob_refs_of(conn, [snippet_id])
+            conn.execute("DELETE FROM snippets WHERE id = ?", (snippet_id,))
+            self._release_blobs(conn, old_refs)
+            self.explanations.invalidate_snippet(snippet_id)
+            self.embeddings.remove(snippet_id)
+        self.cache.invalidate(snippet_id)
+        logger.debug("Сниппет %s удалён успешно", snippet_id)
 
     def close(self):
-        """Закрытие соединения с базой данных."""
-        print("DEBUG: Закрытие соединения с базой данных")
-        if self.conn:
-            self.conn.close()
+        """Закрытие соединений с базой данных."""
+        logger.debug("Закрытие соединения с базой данных")
+        if self.connections:
+            self.connections.close()
 
     def get_snippet_by_title(self, title: str) -> Optional[Dict]:
         """Получение сниппета по точному совпадению названия."""
-        print(f"DEBUG: Поиск сниппета по названию: {title}")
-        self.cursor.execute(
-            "SELECT id, title, language, rich_content, tags FROM snippets WHERE title = ?",
-            (title,)
-        )
-        row = self.cursor.fetchone()
+        logger.debug("Поиск сниппета по названию: %s", title)
+        with self.connections.reader() as conn:
+            row = conn.execute(
+                f"SELECT {SNIPPET_COLUMNS} FROM snippets WHERE title = ?",
+                (title,)
+            ).fetchone()
         if row:
-            try:
-                cells = yaml.safe_load(row[3]) if row[3] else []
-            except yaml.YAMLError:
-                cells = [{"type": "code", "content": row[3]}]
-            return {
-                "id": row[0],
-                "title": row[1],
-                "language": row[2],
-                "cells": cells,
-                "tags": row[4]
-            }
+            return self._row_to_snippet(row)
         return None
\ No newline at end of file
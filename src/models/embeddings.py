@@ -0,0 +1,186 @@
+# src/models/embeddings.py
+"""Индекс эмбеддингов сниппетов для семантического поиска.
+
+Вектор сниппета (название, язык, теги и текст ячеек) хранится в SQLite как
+float32 BLOB вместе с ревизией сниппета и хэшем исходного текста. refresh
+досчитывает только новые и изменённые сниппеты: кандидаты отбираются одним
+запросом по несовпадению ревизии, а совпавший хэш текста позволяет не
+обращаться к модели, если изменилось что-то, кроме текста. Поиск — косинусная
+близость по нормированной матрице в памяти, которая перечитывается из БД
+только после изменений индекса.
+
+Модель эмбеддингов подключаемая: любой callable, превращающий список текстов
+в список векторов. По умолчанию используется /api/embed локального Ollama.
+"""
+import sqlite3
+import threading
+from typing import Callable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy необязателен: без него недоступен только семантический поиск
+    np = None
+
+from src.models.connection import ConnectionManager
+from src.models.explanation_cache import content_hash
+from src.utils.ai_client import get_client
+from src.utils.constants import AI_EMBED_MODEL, EMBED_BATCH_SIZE
+from src.utils.logging_config import get_logger
+
+logger = get_logger("db.embeddings")
+
+Embedder = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+def ollama_embedder(model: str = AI_EMBED_MODEL) -> Embedder:
+    def embed(texts: List[str]) -> List[List[float]]:
+        return get_client().embed(texts, model=model)
+    return embed
+
+
+def snippet_text(title: str, language: str, tags: str, body: str) -> str:
+    """Текст, по которому строится эмбеддинг сниппета."""
+    return "\n".join(part for part in (title, language, tags, body) if part)
+
+
+class EmbeddingIndex:
+    def __init__(self, connections: ConnectionManager, embedder: Optional[Embedder] = None,
+                 model: str = AI_EMBED_MODEL, batch_size: int = EMBED_BATCH_SIZE):
+        self.connections = connections
+        # model отличает векторы разных моделей в таблице; для своего embedder — его имя
+        self.model = model
+        self.embedder = embedder or ollama_embedder(model)
+        self.batch_size = max(1, batch_size)
+        self._refresh_lock = threading.Lock()
+        self._matrix_lock = threading.Lock()
+        self._ids = None
+        self._matrix = None
+
+    @staticmethod
+    def create_tables(cursor: sqlite3.Cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS snippet_embeddings (
+                snippet_id INTEGER PRIMARY KEY,
+                model TEXT NOT NULL,
+                revision INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL
+            )
+        """)
+
+    @property
+    def available(self) -> bool:
+        return np is not None
+
+    def _require_numpy(self):
+        if np is None:
+            raise RuntimeError("Для семантического поиска нужен numpy")
+
+    def _embed(self, texts: List[str]) -> "np.ndarray":
+        vectors = np.asarray(self.embedder(texts), dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[0] != len(texts):
+            raise ValueError(f"Модель вернула эмбеддинги формы {vectors.shape} на {len(texts)} текстов")
+        return vectors
+
+    def refresh(self) -> int:
+        """Досчитывает эмбеддинги новых и изменённых сниппетов, возвращает число посчитанных векторов.
+
+        Векторы записываются пачками по batch_size, поэтому при ошибке модели
+        уже посчитанные сохраняются и следующий вызов продолжит с оставшихся.
+        Сниппеты, которые фоновая миграция ещё не перекодировала (search_body
+        IS NULL), пропускаются: миграция не меняет revision, и вектор по
+        пустому тексту иначе так и остался бы актуальным.
+        """
+        self._require_numpy()
+        with self._refresh_lock:
+            with self.connections.reader() as conn:
+                rows = conn.execute(
+                    "SELECT s.id, s.revision, s.title, s.language, s.tags, s.search_body, e.content_hash "
+                    "FROM snippets s LEFT JOIN snippet_embeddings e ON e.snippet_id = s.id AND e.model = ? "
+                    "WHERE s.search_body IS NOT NULL AND (e.snippet_id IS NULL OR e.revision != s.revision)",
+                    (self.model,)
+                ).fetchall()
+            if not rows:
+                return 0
+
+            touched, pending = [], []
+            for snippet_id, revision, title, language, tags, body, old_hash in rows:
+                text = snippet_text(title, language, tags, body)
+                key = content_hash(self.model, text)
+                if key == old_hash:
+                    touched.append((revision, snippet_id))
+                else:
+                    pending.append((snippet_id, revision, key, text))
+            if touched:
+                with self.connections.writer() as conn:
+                    conn.executemany("UPDATE snippet_embeddings SET revision = ? WHERE snippet_id = ?", touched)
+
+            logger.debug("Эмбеддинги: %s сниппетов к пересчёту, %s без изменений текста", len(pending), len(touched))
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                vectors = self._embed([item[3] for item in batch])
+                with self.connections.writer() as conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO snippet_embeddings "
+                        "(snippet_id, model, revision, content_hash, dim, vector) VALUES (?, ?, ?, ?, ?, ?)",
+                        [(snippet_id, self.model, revision, key, vector.shape[0], vector.tobytes())
+                         for (snippet_id, revision, key, _), vector in zip(batch, vectors)]
+                    )
+                self._reset_matrix()
+            return len(pending)
+
+    def remove(self, snippet_id: int):
+        with self.connections.writer() as conn:
+            cursor = conn.execute("DELETE FROM snippet_embeddings WHERE snippet_id = ?", (snippet_id,))
+        if cursor.rowcount:
+            self._reset_matrix()
+
+    def _reset_matrix(self):
+        with self._matrix_lock:
+            self._ids = None
+            self._matrix = None
+
+    def _load_matrix(self, dim: int) -> Tuple["np.ndarray", "np.ndarray"]:
+        """id и нормированные векторы текущей модели; читаются из БД один раз до следующего изменения."""
+        with self._matrix_lock:
+            if self._matrix is not None and self._matrix.shape[1] == dim:
+                return self._ids, self._matrix
+            with self.connections.reader() as conn:
+                rows = conn.execute(
+                    "SELECT snippet_id, vector FROM snippet_embeddings WHERE model = ? AND dim = ?",
+                    (self.model, dim)
+                ).fetchall()
+            ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            matrix = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), dim)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._ids, self._matrix = ids, matrix / norms
+            logger.debug("Матрица эмбеддингов загружена: %s x %s", len(rows), dim)
+            return self._ids, self._matrix
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """k ближайших к запросу сниппетов: [(snippet_id, косинусная близость)] по убыванию близости."""
+        self._require_numpy()
+        if k <= 0:
+            return []
+        query_vector = self._embed([query])[0]
+        norm = np.linalg.norm(query_vector)
+        if norm == 0:
+            return []
+        ids, matrix = self._load_matrix(query_vector.shape[0])
+        if not len(ids):
+            return []
+        scores = matrix @ (query_vector / norm)
+        k = min(k, len(ids))
+        # argpartition отбирает k лучших за O(n), сортируются только они
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def stats(self) -> dict:
+        with self.connections.reader() as conn:
+            count = conn.execute(
+                "SELECT COUNT(*) FROM snippet_embeddings WHERE model = ?", (self.model,)
+            ).fetchone()[0]
+        return {"size": count, "model": self.model}
@@ -0,0 +1,146 @@
+# src/models/explanation_cache.py
+"""Постоянный кэш объяснений AI в SQLite.
+
+Ключ — (модель, версия шаблона промпта, хэш содержимого): тот же промпт к
+той же модели не отправляется повторно между запусками. Записи живут не
+дольше ttl_seconds, при превышении max_entries вытесняются самые давно
+использованные. snippet_id нужен только для инвалидации при изменении сниппета.
+
+Попадание в кэш только читает: отметка последнего использования копится в
+памяти и записывается вместе со следующим put, поэтому клик по ячейке не
+ждёт писателя, занятого импортом или миграцией.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from src.models.connection import ConnectionManager
+from src.utils.constants import AI_CACHE_MAX_ENTRIES, AI_CACHE_TTL_SECONDS
+from src.utils.logging_config import get_logger
+
+logger = get_logger("db.explanations")
+
+
+def content_hash(*parts: str) -> str:
+    """SHA-256 частей промпта; разделитель исключает совпадение ("ab", "c") и ("a", "bc")."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def cell_content_hash(language: str, content: str) -> str:
+    return content_hash(language, content)
+
+
+class ExplanationCache:
+    def __init__(self, connections: ConnectionManager, ttl_seconds: float = AI_CACHE_TTL_SECONDS,
+                 max_entries: int = AI_CACHE_MAX_ENTRIES):
+        self.connections = connections
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._touches: Dict[tuple, float] = {}  # (model, template, content_hash) -> last_used
+        self._touch_lock = threading.Lock()
+
+    @staticmethod
+    def create_tables(cursor: sqlite3.Cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ai_explanations (
+                model TEXT NOT NULL,
+                template TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                snippet_id INTEGER,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, template, content_hash)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_explanations_snippet ON ai_explanations(snippet_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_explanations_used ON ai_explanations(last_used)")
+
+    def get(self, model: str, template: str, key: str) -> Optional[str]:
+        """Сохранённый ответ или None для отсутствующей или просроченной записи.
+
+        Только читает БД; просроченные записи удаляет следующий put.
+        """
+        now = time.time()
+        with self.connections.reader() as conn:
+            row = conn.execute(
+                "SELECT response FROM ai_explanations "
+                "WHERE model = ? AND template = ? AND content_hash = ? AND created_at >= ?",
+                (model, template, key, now - self.ttl_seconds)
+            ).fetchone()
+        if row is None:
+            return None
+        with self._touch_lock:
+            self._touches[(model, template, key)] = now
+        return row[0]
+
+    def has(self, model: str, template: str, key: str) -> bool:
+        """Есть ли непросроченный ответ; в отличие от get не меняет порядок вытеснения."""
+        with self.connections.reader() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM ai_explanations WHERE model = ? AND template = ? AND content_hash = ? "
+                "AND created_at >= ?",
+                (model, template, key, time.time() - self.ttl_seconds)
+            ).fetchone()
+        return row is not None
+
+    def put(self, model: str, template: str, key: str, response: str, snippet_id: Optional[int] = None):
+        now = time.time()
+        with self.connections.writer() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_explanations "
+                "(model, template, content_hash, snippet_id, response, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (model, template, key, snippet_id, response, now, now)
+            )
+            self._flush_touches(conn)
+            self._evict(conn, now)
+
+    def _flush_touches(self, conn: sqlite3.Connection):
+        """Записывает накопленные отметки использования перед вытеснением."""
+        with self._touch_lock:
+            touches, self._touches = self._touches, {}
+        if touches:
+            conn.executemany(
+                "UPDATE ai_explanations SET last_used = MAX(last_used, ?) "
+                "WHERE model = ? AND template = ? AND content_hash = ?",
+                [(used, model, template, key) for (model, template, key), used in touches.items()]
+            )
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM ai_explanations WHERE created_at < ?", (now - self.ttl_seconds,))
+        conn.execute(
+            "DELETE FROM ai_explanations WHERE rowid IN ("
+            "SELECT rowid FROM ai_explanations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def invalidate_snippet(self, snippet_id: int, keep_hashes: Iterable[str] = ()):
+        """Удаляет объяснения сниппета, кроме записей с хэшами из keep_hashes (неизменённые ячейки)."""
+        keep = list(keep_hashes)
+        placeholders = ", ".join("?" for _ in keep)
+        with self.connections.writer() as conn:
+            cursor = conn.execute(
+                "DELETE FROM ai_explanations WHERE snippet_id = ?"
+                + (f" AND content_hash NOT IN ({placeholders})" if keep else ""),
+                [snippet_id] + keep
+            )
+        if cursor.rowcount:
+            logger.debug("Удалено %s объяснений сниппета ID %s", cursor.rowcount, snippet_id)
+
+    def clear(self):
+        with self._touch_lock:
+            self._touches.clear()
+        with self.connections.writer() as conn:
+            conn.execute("DELETE FROM ai_explanations")
+
+    def stats(self) -> Dict[str, int]:
+        with self.connections.reader() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM ai_explanations").fetchone()[0]
+        return {"size": count, "maxsize": self.max_entries}
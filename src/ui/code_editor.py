@@ -1,5 +1,8 @@
 import flet as ft
 from typing import List, Dict, Optional
+from src.utils.logging_config import get_logger
+
+logger = get_logger("ui.code_editor")
 
 
 class MultiCellEditor(ft.UserControl):
@@ -138,4 +141,4 @@ class MultiCellEditor(ft.UserControl):
         # Всегда вызываем update — Flet корректно обработает,
         # даже если элемент ещё не добавлен на страницу.
         self.update()
-        print(f"DEBUG: MultiCellEditor.load_cells вызван, ячеек={len(cells)}")
\ No newline at end of file
+        logger.debug("MultiCellEditor.load_cells вызван, ячеек=%s", len(cells))
\ No newline at end of file
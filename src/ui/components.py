@@ -1,13 +1,26 @@
 import flet as ft
-from typing import List, Dict, Any, Callable
+from typing import List, Dict, Any, Callable, Optional
+from src.models.blob_store import BlobStore
+from src.ui.image_view import build_image
+from src.utils.constants import CELL_PREVIEW_DELAY_SECONDS, CELL_PREVIEW_MAX_WAIT_SECONDS
+from src.utils.debounce import Debouncer
+from src.utils.logging_config import get_logger
+
+logger = get_logger("ui.components")
 
 class CellEditor(ft.UserControl):
-    def __init__(self, cell_data: Dict[str, Any] = None, on_delete: Callable = None, on_change: Callable = None):
+    def __init__(self, cell_data: Dict[str, Any] = None, on_delete: Callable = None, on_change: Callable = None,
+                 blob_store: Optional[BlobStore] = None):
         super().__init__()
         self.cell_data = cell_data or {'type': 'text', 'content': ''}
         self.on_delete = on_delete
         self.on_change = on_change
+        self.blob_store = blob_store
         self.preview = ft.Container()
+        # Нажатия клавиш объединяются: превью перерисовывается после паузы или раз в max_wait
+        self._preview_debouncer = Debouncer(
+            CELL_PREVIEW_DELAY_SECONDS, self._render_preview, max_wait=CELL_PREVIEW_MAX_WAIT_SECONDS
+        )
         self._build_components()
 
     def _build_components(self):
@@ -84,7 +97,8 @@ class CellEditor(ft.UserControl):
 
         delete_btn = ft.IconButton(ft.icons.DELETE, tooltip="Удалить ячейку", on_click=lambda e: self.on_delete(self))
 
-        self.preview = self._build_preview()
+        self.preview = ft.Container(content=self._build_preview())
+        self._preview_state = self._current_preview_state()
 
         self.content = ft.Column([
             ft.Row([
@@ -107,21 +121,38 @@ class CellEditor(ft.UserControl):
         elif ctype == 'markdown':
             return ft.Markdown(content, extension_set=ft.MarkdownExtensionSet.GITHUB_WEB, selectable=True)
         elif ctype == 'image':
-            return ft.Image(src=content, width=200, height=200, fit=ft.ImageFit.CONTAIN, error_content=ft.Text("Неверное изображение"))
+            return build_image(content, self.blob_store)
         else:
             return ft.Text(content)
         return ft.Container()
 
+    def _current_preview_state(self) -> tuple:
+        return (
+            self.cell_data['type'],
+            self.language_dropdown.value if self.language_dropdown else None,
+            self.content_field.value
+        )
+
     def _on_type_change(self, e):
+        self._preview_debouncer.cancel()
         self.cell_data['type'] = e.control.value
         self._build_components()
         self.update()
 
     def _update_preview(self, e):
-        self.preview = self._build_preview()
         if self.on_change:
             self.on_change()
-        self.update()
+        self._preview_debouncer.trigger()
+
+    def _render_preview(self):
+        """Перерисовывает только контейнер превью (в потоке таймера Debouncer)."""
+        state = self._current_preview_state()
+        if state == self._preview_state:
+            return
+        self._preview_state = state
+        self.preview.content = self._build_preview()
+        if self.preview.page:
+            self.preview.update()
 
     def get_cell_data(self) -> Dict[str, Any]:
         cell = {
@@ -133,16 +164,18 @@ class CellEditor(ft.UserControl):
         return cell
 
 class SnippetEditor:
-    def __init__(self, snippet: Dict = None, on_save: Callable = None, on_cancel: Callable = None):
+    def __init__(self, snippet: Dict = None, on_save: Callable = None, on_cancel: Callable = None,
+                 blob_store: Optional[BlobStore] = None):
         self.snippet = snippet or {'id': None, 'title': "", 'language': "python", 'cells': [], 'tags': ""}
         self.on_save = on_save
         self.on_cancel = on_cancel
+        self.blob_store = blob_store
         self.cell_editors: List[CellEditor] = []
         self.cells_list = ft.Column(scroll=ft.ScrollMode.AUTO, expand=True)
         self._build_components()
 
     def _build_components(self):
-        print("DEBUG: Построение компонентов SnippetEditor")
+        logger.debug("Построение компонентов SnippetEditor")
         self.title_field = ft.TextField(value=self.snippet['title'], label="Название", width=400)
         self.language_dropdown = ft.Dropdown(
             value=self.snippet['language'],
@@ -184,19 +217,20 @@ class SnippetEditor:
         ], scroll=ft.ScrollMode.AUTO, expand=True)
 
     def _add_cell(self, e):
-        print("DEBUG: Добавление новой ячейки")
+        logger.debug("Добавление новой ячейки")
         self._add_cell_editor({'type': 'text', 'content': ''})
 
     def _add_cell_editor(self, cell_data: Dict):
-        print("DEBUG: Добавление редактора ячейки")
-        editor = CellEditor(cell_data=cell_data, on_delete=self._remove_cell_editor, on_change=lambda: None)
+        logger.debug("Добавление редактора ячейки")
+        editor = CellEditor(cell_data=cell_data, on_delete=self._remove_cell_editor, on_change=lambda: None,
+                            blob_store=self.blob_store)
         self.cell_editors.append(editor)
         self.cells_list.controls.append(editor)
         # Note: We can't call self.update() here since we're not a UserControl anymore
         # The caller will need to update the page
 
     def _remove_cell_editor(self, editor: 'CellEditor'):
-        print("DEBUG: Удаление редактора ячейки")
+        logger.debug("Удаление редактора ячейки")
         if editor in self.cell_editors:
             self.cell_editors.remove(editor)
             self.cells_list.controls.remove(editor)
@@ -204,12 +238,12 @@ class SnippetEditor:
             # The caller will need to update the page
 
     def _on_save_click(self, e):
-        print("DEBUG: Обработка сохранения в SnippetEditor")
+        logger.debug("Обработка сохранения в SnippetEditor")
         if self.on_save:
             self.on_save(self.get_snippet_data())
 
     def _on_cancel_click(self, e):
-        print("DEBUG: Обработка отмены в SnippetEditor")
+        logger.debug("Обработка отмены в SnippetEditor")
         if self.on_cancel:
             self.on_cancel()
 
@@ -1,6 +1,9 @@
 import flet as ft
 from src.ui.code_editor import MultiCellEditor
 from src.utils.constants import SUPPORTED_LANGUAGES
+from src.utils.logging_config import get_logger
+
+logger = get_logger("ui.dialogs")
 
 
 class AddSnippetDialog:
@@ -167,7 +170,7 @@ class EditSnippetDialog:
         self.page.dialog = self.dialog
         self.dialog.open = True
         self.page.update()
-        print(f"DEBUG: EditSnippetDialog открыт для сниппета ID={snippet_id}, ячеек={len(cells)}")
+        logger.debug("EditSnippetDialog открыт для сниппета ID=%s, ячеек=%s", snippet_id, len(cells))
 
 
     def close(self):
@@ -0,0 +1,53 @@
+import flet as ft
+from typing import Callable, Dict, List
+
+from src.ui.snippet_card import SnippetCard
+from src.utils.logging_config import get_logger
+
+logger = get_logger("ui.grid")
+
+
+class GridReconciler:
+    """Синхронизирует карточки сетки со списком сниппетов по snippet_id.
+
+    Неизменённые карточки переиспользуются, изменённые обновляются через
+    SnippetCard.update_content, остальные создаются или удаляются. Так Flet
+    отправляет клиенту только разницу, а не всю сетку заново.
+    """
+
+    def __init__(self, grid: ft.GridView, create_card: Callable[[Dict], SnippetCard]):
+        self.grid = grid
+        self.create_card = create_card
+
+    @staticmethod
+    def _is_changed(card: SnippetCard, snippet: Dict) -> bool:
+        return (
+            card.revision != snippet.get("revision")
+            or card.title != snippet["title"]
+            or card.language != snippet["language"]
+            or card.tags != snippet["tags"]
+        )
+
+    def reconcile(self, snippets: List[Dict]) -> bool:
+        """Приводит grid.controls к snippets. Возвращает True, если изменился состав или порядок карточек."""
+        existing = {
+            control.snippet_id: control for control in self.grid.controls if isinstance(control, SnippetCard)
+        }
+
+        new_controls = []
+        for snippet in snippets:
+            card = existing.get(snippet["id"])
+            if card is None:
+                card = self.create_card(snippet)
+            elif self._is_changed(card, snippet):
+                logger.debug("Обновление карточки сниппета ID %s", snippet['id'])
+                card.update_content(
+                    snippet["title"], snippet["language"], snippet["cells"],
+                    tags=snippet["tags"], revision=snippet.get("revision"), preview=snippet.get("preview")
+                )
+            new_controls.append(card)
+
+        if [id(c) for c in new_controls] == [id(c) for c in self.grid.controls]:
+            return False
+        self.grid.controls[:] = new_controls
+        return True
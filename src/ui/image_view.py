@@ -0,0 +1,30 @@
+import flet as ft
+from typing import Optional
+
+from src.models.blob_store import BlobStore, blob_key, is_blob_ref
+from src.utils.constants import THUMBNAIL_MAX_SIDE
+
+
+def _placeholder(size: int) -> ft.Control:
+    return ft.Container(
+        content=ft.Icon(ft.icons.IMAGE_NOT_SUPPORTED, color=ft.colors.GREY_500),
+        width=size, height=size, alignment=ft.alignment.center,
+        tooltip="Предпросмотр недоступен",
+    )
+
+
+def build_image(content: str, blob_store: Optional[BlobStore] = None,
+                size: int = 200, max_side: int = THUMBNAIL_MAX_SIDE) -> ft.Control:
+    """Изображение ячейки: ссылки blob: отдаются миниатюрой из хранилища, остальное — как src.
+
+    Если миниатюру построить нельзя (нет Pillow или изображение повреждено),
+    показывается заглушка того же размера, а не оригинал.
+    """
+    error = ft.Text("Неверное изображение")
+    if is_blob_ref(content):
+        encoded = blob_store.thumbnail_base64(blob_key(content), max_side) if blob_store else None
+        if encoded is None:
+            return _placeholder(size)
+        return ft.Image(src_base64=encoded, width=size, height=size, fit=ft.ImageFit.CONTAIN,
+                        error_content=error)
+    return ft.Image(src=content, width=size, height=size, fit=ft.ImageFit.CONTAIN, error_content=error)
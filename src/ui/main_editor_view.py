@@ -2,6 +2,9 @@ import flet as ft
 from src.models.database import Database
 from src.ui.code_editor import MultiCellEditor
 from src.utils.constants import SUPPORTED_LANGUAGES
+from src.utils.logging_config import get_logger
+
+logger = get_logger("ui.main_editor")
 
 
 class MainEditorView(ft.UserControl):
@@ -33,7 +36,7 @@ class MainEditorView(ft.UserControl):
 
     def did_mount(self):
         """Вызывается после добавления виджета на страницу — безопасно обновлять."""
-        print("DEBUG: MainEditorView.did_mount вызван")
+        logger.debug("MainEditorView.did_mount вызван")
         self._load_snippets()
         if self.initial_snippet:
             self._open_snippet(self.initial_snippet)
@@ -79,9 +82,10 @@ class MainEditorView(ft.UserControl):
         )
 
     def _load_snippets(self):
-        print("DEBUG: MainEditorView._load_snippets вызван")
+        logger.debug("MainEditorView._load_snippets вызван")
         self.snippets_list_view.controls.clear()
-        snippets = self.db.get_snippets()
+        # Для списка слева достаточно заголовков — содержимое загружается при открытии
+        snippets = self.db.get_snippet_headers()
 
         for snippet in snippets:
             card = ft.Container(
@@ -96,7 +100,7 @@ class MainEditorView(ft.UserControl):
                 padding=10,
                 border_radius=5,
                 bgcolor=ft.colors.SURFACE,
-                on_click=lambda e, s=snippet: self._open_snippet(s),
+                on_click=lambda e, sid=snippet["id"]: self._open_snippet_by_id(sid),
                 border=ft.border.all(1, ft.colors.OUTLINE),
                 margin=ft.margin.only(bottom=5)
             )
@@ -109,9 +113,14 @@ class MainEditorView(ft.UserControl):
         # Теперь безопасно — виджет уже на странице
         self.snippets_list_view.update()
 
+    def _open_snippet_by_id(self, snippet_id: int):
+        snippet = self.db.get_snippet_by_id(snippet_id)
+        if snippet:
+            self._open_snippet(snippet)
+
     def _open_snippet(self, snippet):
         self.current_snippet = snippet
-        print(f"DEBUG: Открываем сниппет: {snippet.get('title')} (ID={snippet.get('id')})")
+        logger.debug("Открываем сниппет: %s (ID=%s)", snippet.get('title'), snippet.get('id'))
 
 
         self.title_field = ft.TextField(label="Название", value=snippet["title"], width=500)
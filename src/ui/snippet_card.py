@@ -1,6 +1,9 @@
 import flet as ft
 from typing import Callable, Optional, List, Dict
-import yaml
+
+from src.models.blob_store import BlobStore
+from src.models.codec import cells_to_yaml
+from src.ui.image_view import build_image
 
 
 class SnippetCard(ft.Container):
@@ -13,10 +16,14 @@ class SnippetCard(ft.Container):
         language: str,
         cells: List[Dict[str, str]],
         tags: str = "",
+        revision: Optional[int] = None,
+        preview: Optional[str] = None,
         on_copy: Optional[Callable[[str], None]] = None,
         on_delete: Optional[Callable[[int], None]] = None,
         on_edit: Optional[Callable[[int, str, str, List[Dict[str, str]]], None]] = None,
         on_study: Optional[Callable[[int, str, str, List[Dict[str, str]], str], None]] = None,
+        blob_store: Optional[BlobStore] = None,
+        materialized: bool = True,
         expand: bool = False,
         **kwargs
     ):
@@ -25,14 +32,19 @@ class SnippetCard(ft.Container):
         self.language = language
         self.cells = cells
         self.tags = tags
+        self.revision = revision
+        # Готовый Markdown-превью из БД; без него карточка рисует все ячейки
+        self.preview = preview
 
         self.on_copy = on_copy
         self.on_delete = on_delete
         self.on_edit = on_edit
         self.on_study = on_study
+        self.blob_store = blob_store
+        self.materialized = materialized
 
-        # Build card content
-        content = self._build_content()
+        # Build card content; вне экрана — только лёгкая заглушка
+        content = self._build_content() if materialized else self._build_placeholder()
 
         super().__init__(
             content=content,
@@ -43,8 +55,8 @@ class SnippetCard(ft.Container):
             **kwargs
         )
 
-    def _build_content(self) -> ft.Column:
-        header = ft.Row(
+    def _build_header(self) -> ft.Row:
+        return ft.Row(
             controls=[
                 ft.Icon("code", color="#60A5FA"),
                 ft.Text(self.title, weight="bold", size=16, expand=True, no_wrap=True),
@@ -58,7 +70,25 @@ class SnippetCard(ft.Container):
             alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
         )
 
-        # Рендерим ячейки
+    def _build_placeholder(self) -> ft.Column:
+        """Заглушка для карточки вне экрана: только заголовок, без Markdown ячеек."""
+        return ft.Column(controls=[self._build_header()], expand=True)
+
+    def _build_preview_controls(self) -> list:
+        """Превью из БД одним Markdown-контролом вместо всех ячеек."""
+        return [
+            ft.Container(
+                content=ft.Markdown(
+                    self.preview,
+                    extension_set=ft.MarkdownExtensionSet.GITHUB_WEB,
+                    code_theme="atom-one-dark",
+                    selectable=True,
+                ),
+                padding=ft.padding.only(bottom=10),
+            )
+        ]
+
+    def _build_cells_controls(self) -> list:
         cells_controls = []
         for cell in self.cells:
             cell_type = cell.get("type", "code")
@@ -89,6 +119,21 @@ class SnippetCard(ft.Container):
                         border_radius=5,
                     )
                 )
+            elif cell_type == "image":
+                # Миниатюра из хранилища вместо полноразмерного файла
+                cells_controls.append(
+                    ft.Container(
+                        content=build_image(content, self.blob_store, size=160),
+                        padding=ft.padding.only(bottom=10),
+                    )
+                )
+        return cells_controls
+
+    def _build_content(self) -> ft.Column:
+        header = self._build_header()
+
+        # Рендерим ячейки: в сетке только превью, ячейки (и их разбор) не трогаются
+        cells_controls = self._build_preview_controls() if self.preview else self._build_cells_controls()
 
         # === КЛЮЧЕВОЕ ИЗМЕНЕНИЕ: Контейнер с прокруткой + фиксированные кнопки снизу ===
         scrollable_content = ft.Container(
@@ -134,7 +179,7 @@ class SnippetCard(ft.Container):
 
     def _handle_copy(self, e):
         if self.on_copy:
-            yaml_content = yaml.dump(self.cells, allow_unicode=True)
+            yaml_content = cells_to_yaml(self.cells)
             self.on_copy(yaml_content)
 
     def _handle_delete(self, e):
@@ -149,10 +194,34 @@ class SnippetCard(ft.Container):
         if self.on_study:
             self.on_study(self.snippet_id, self.title, self.language, self.cells, self.tags)
 
-    def update_content(self, title: str, language: str, cells: list):
+    def update_content(self, title: str, language: str, cells: list,
+                       tags: Optional[str] = None, revision: Optional[int] = None,
+                       preview: Optional[str] = None):
         """Update card content and refresh UI."""
         self.title = title
         self.language = language
         self.cells = cells
+        if tags is not None:
+            self.tags = tags
+        self.revision = revision
+        self.preview = preview
+        self.content = self._build_content() if self.materialized else self._build_placeholder()
+        # Карточка может быть ещё не добавлена на страницу
+        if self.page:
+            self.update()
+
+    def materialize(self) -> bool:
+        """Строит полное содержимое карточки. Возвращает True, если оно было заглушкой."""
+        if self.materialized:
+            return False
+        self.materialized = True
         self.content = self._build_content()
-        self.update()
\ No newline at end of file
+        return True
+
+    def release(self) -> bool:
+        """Заменяет содержимое заглушкой, освобождая дерево контролов. True, если что-то изменилось."""
+        if not self.materialized:
+            return False
+        self.materialized = False
+        self.content = self._build_placeholder()
+        return True
@@ -1,16 +1,96 @@
 # src/ui/study_view.py
 import flet as ft
+import re
 import threading
-from src.utils.ai_helper import query_ollama
+from typing import Callable, Dict, List, Optional
+from src.models.explanation_cache import ExplanationCache, cell_content_hash, content_hash
+from src.utils.ai_scheduler import (
+    AIScheduler, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, PRIORITY_SNIPPET, get_scheduler
+)
+from src.utils.logging_config import get_logger
+from src.utils.constants import AI_MODEL
+
+# Версии шаблонов промптов входят в ключ кэша: изменение текста промпта — новая версия
+CELL_PROMPT_TEMPLATE = "cell-v1"
+SNIPPET_PROMPT_TEMPLATE = "snippet-v1"
+BATCH_PROMPT_TEMPLATE = "batch-v1"
+# Группа заданий подготовки следующих сниппетов: переживает уход с экрана, чтобы
+# объяснения успели подготовиться к открытию следующего сниппета
+PREFETCH_NEXT_GROUP = "study-prefetch-next"
+
+# Маркер раздела ответа в пакетном промпте: "### CELL 3"
+CELL_MARKER = "### CELL"
+_CELL_MARKER_RE = re.compile(r"###\s+CELL\s+(\d+)\s*:?", re.IGNORECASE)
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+logger = get_logger("ui.study")
+
+
+def build_cell_prompt(language: str, cell_content: str) -> str:
+    return f"""Кратко объясни на русском, что делает этот код на языке {language}:
+
+{cell_content}
+"""
+
+
+def build_batch_prompt(language: str, cells: Dict[int, str]) -> str:
+    """Один промпт на несколько ячеек; ответ на каждую просим начинать маркером с её номером."""
+    sections = "\n\n".join(f"{CELL_MARKER} {idx}\n```{language}\n{content}\n```" for idx, content in cells.items())
+    return f"""Кратко объясни на русском, что делает каждый из фрагментов кода на языке {language}.
+Для каждого фрагмента напиши отдельный раздел. Начинай раздел строкой "{CELL_MARKER} <номер>" с тем же номером,
+что у фрагмента, и ничего больше в этой строке не пиши. Не пропускай фрагменты и не объединяй их.
+
+{sections}
+"""
+
+
+def split_cell_answers(text: str) -> Dict[int, str]:
+    """Разделы ответа на пакетный промпт по номерам ячеек; текст до первого маркера отбрасывается.
+
+    Маркером считается только строка "### CELL n" вне блоков кода: комментарий
+    "# CELL 1" внутри ``` в ответе модели раздел не разрывает.
+    """
+    answers = {}
+    current, lines, fence = None, [], None
+    for line in text.splitlines():
+        fence_match = _FENCE_RE.match(line)
+        if fence_match:
+            if fence is None:
+                fence = fence_match.group(1)
+            elif fence_match.group(1) == fence:
+                fence = None
+        elif fence is None:
+            marker = _CELL_MARKER_RE.fullmatch(line.strip())
+            if marker:
+                if current is not None:
+                    answers[current] = "\n".join(lines).strip()
+                current, lines = int(marker.group(1)), []
+                continue
+        if current is not None:
+            lines.append(line)
+    if current is not None:
+        answers[current] = "\n".join(lines).strip()
+    return answers
 
 
 class StudySnippetView(ft.UserControl):
-    def __init__(self, snippet: dict, on_back):
+    def __init__(self, snippet: dict, on_back, explanation_cache: Optional[ExplanationCache] = None,
+                 scheduler: Optional[AIScheduler] = None, prefetch: bool = False,
+                 prefetch_snippets: Optional[Callable[[], List[Dict]]] = None):
+        """prefetch включает фоновую подготовку объяснений всех ячеек в кэш при открытии;
+        prefetch_snippets (вызывается в фоне) возвращает дополнительные сниппеты, например следующие в сетке."""
         super().__init__()
         self.snippet = snippet
         self.on_back = on_back
+        self.explanation_cache = explanation_cache
+        # Задания этого экрана — одна группа в общей очереди, снимается при уходе
+        self.scheduler = scheduler or get_scheduler()
+        self.prefetch = prefetch and explanation_cache is not None
+        self.prefetch_snippets = prefetch_snippets
+        self._active = True
         self.explanation_markdowns = {}      # Markdown-контролы объяснений
         self.toggle_buttons = {}             # Кнопки "Показать"/"Скрыть"
+        self._failed = set()                 # Markdown-контролы с текстом ошибки: клик запросит заново
         self.sidebar_visible = False
         self.full_explanation_md = None
 
@@ -22,9 +102,14 @@ class StudySnippetView(ft.UserControl):
         )
 
         header = ft.Row([
-            ft.IconButton(ft.icons.ARROW_BACK, on_click=lambda _: self.on_back()),
+            ft.IconButton(ft.icons.ARROW_BACK, on_click=lambda _: self._leave()),
             ft.Text("Изучение сниппета", size=20),
             ft.Container(expand=True),
+            ft.IconButton(
+                ft.icons.FORMAT_LIST_NUMBERED,
+                tooltip="Объяснить все ячейки одним запросом",
+                on_click=self._handle_batch_explain
+            ),
             ft.IconButton(
                 ft.icons.SCHOOL,
                 tooltip="Объяснить весь сниппет",
@@ -165,81 +250,251 @@ class StudySnippetView(ft.UserControl):
         md.update()
         toggle_btn.update()
 
+    def _snippet_text(self) -> str:
+        full_text = ""
+        for cell in self.snippet["cells"]:
+            if cell["type"] in ("markdown", "text"):
+                full_text += cell["content"] + "\n\n"
+            else:
+                full_text += f"```{self.snippet['language']}\n{cell['content']}\n```\n\n"
+        return full_text
+
+    def _snippet_prompt(self, full_text: str) -> str:
+        return f"""Вы — эксперт-преподаватель по программированию. Объясните сниппет полностью:
+
+Название: {self.snippet['title']}
+Язык: {self.snippet['language']}
+Теги: {self.snippet['tags']}
+
+Содержимое сниппета:
+{full_text}
+
+Объясните подробно:
+1. Общую цель и назначение сниппета
+2. Ключевые концепции и технологии
+3. Как работает код пошагово
+4. Что должен запомнить студент?
+5. Практическое применение этого кода
+
+Отвечайте на русском языке, структурированно и понятно.
+"""
+
+    def _cached_explanation(self, template: str, key: str) -> Optional[str]:
+        if not self.explanation_cache:
+            return None
+        return self.explanation_cache.get(AI_MODEL, template, key)
+
+    def _cached_cell_explanation(self, key: str) -> Optional[str]:
+        """Объяснение ячейки: отдельный ответ или раздел пакетного (BATCH_PROMPT_TEMPLATE)."""
+        return (self._cached_explanation(CELL_PROMPT_TEMPLATE, key)
+                or self._cached_explanation(BATCH_PROMPT_TEMPLATE, key))
+
     def _explain_cell(self, e, cell_index: int, cell_content: str):
         md = self.explanation_markdowns[cell_index]
-        toggle_btn = self.toggle_buttons[cell_index]
 
         # Если уже загружено — просто переключаем видимость
-        if md.value and md.value != "":
+        if self._is_loaded(md):
             self._toggle_explanation(cell_index)
             return
 
-        # Показываем загрузку
-        md.value = "_Анализирую..._"
+        key = cell_content_hash(self.snippet['language'], cell_content)
+        cached = self._cached_cell_explanation(key)
+
+        # Показываем сохранённый ответ или загрузку
+        self._reveal(cell_index, cached or "_Анализирую..._")
+        if cached:
+            return
+        self._submit_cell(cell_index, cell_content, key)
+
+    def _reveal(self, cell_index: int, text: str):
+        md = self.explanation_markdowns[cell_index]
+        toggle_btn = self.toggle_buttons[cell_index]
+        self._failed.discard(md)
+        md.value = text
         md.visible = True
         toggle_btn.text = "Скрыть"
         toggle_btn.visible = True
-        md.update()
-        toggle_btn.update()
+        if md.page:
+            md.update()
+            toggle_btn.update()
 
-        def worker():
-            try:
-                prompt = f"""Кратко объясни на русском, что делает этот код на языке {self.snippet['language']}:
+    def _submit_cell(self, cell_index: int, cell_content: str, key: str):
+        self._submit(self.explanation_markdowns[cell_index],
+                     build_cell_prompt(self.snippet['language'], cell_content), CELL_PROMPT_TEMPLATE, key,
+                     PRIORITY_INTERACTIVE, lambda ex: f" Ошибка: {str(ex)}")
 
-{cell_content}
-"""
-                response = query_ollama(prompt, model="qwen2.5-coder:1.5b")
-            except Exception as ex:
-                response = f" Ошибка: {str(ex)}"
+    def _handle_batch_explain(self, e):
+        """Объясняет все ещё не объяснённые ячейки одним запросом к модели.
 
-            md.value = response
-            md.update()
+        Ответ делится на разделы по маркерам; ячейки, для которых раздел не
+        найден, объясняются отдельными запросами.
+        """
+        pending = {}
+        for idx, cell in enumerate(self.snippet["cells"]):
+            if idx not in self.explanation_markdowns or self._is_loaded(self.explanation_markdowns[idx]):
+                continue
+            content = cell.get("content", "")
+            key = cell_content_hash(self.snippet['language'], content)
+            cached = self._cached_cell_explanation(key)
+            self._reveal(idx, cached or "_Анализирую..._")
+            if not cached:
+                pending[idx] = (content, key)
+        if len(pending) <= 1:
+            for idx, (content, key) in pending.items():
+                self._submit_cell(idx, content, key)
+            return
 
-        threading.Thread(target=worker, daemon=True).start()
+        def show_sections(text: str):
+            for idx, answer in split_cell_answers(text).items():
+                if idx in pending and answer:
+                    self._show(self.explanation_markdowns[idx], answer)
+
+        def on_done(text: str):
+            answers = split_cell_answers(text)
+            missing = []
+            for idx, (content, key) in pending.items():
+                answer = answers.get(idx)
+                if not answer:
+                    missing.append(idx)
+                    continue
+                # Раздел сохраняется по ключу ячейки под своим шаблоном — повторный клик возьмёт его из кэша
+                if self.explanation_cache:
+                    self.explanation_cache.put(AI_MODEL, BATCH_PROMPT_TEMPLATE, key, answer,
+                                               snippet_id=self.snippet.get("id"))
+                self._show(self.explanation_markdowns[idx], answer)
+            if missing:
+                logger.debug("В пакетном ответе нет разделов для ячеек %s, запрашиваем по одной", missing)
+            for idx in missing:
+                if not self._active:
+                    return
+                self._show(self.explanation_markdowns[idx], "_Анализирую..._")
+                self._submit_cell(idx, *pending[idx])
+
+        def on_error(ex: Exception):
+            for idx in pending:
+                self._show_error(self.explanation_markdowns[idx], f" Ошибка: {str(ex)}")
+
+        cells = {idx: content for idx, (content, _) in pending.items()}
+        batch_key = content_hash(self.snippet['language'], *(f"{idx}:{content}" for idx, content in cells.items()))
+        self.scheduler.submit(
+            (AI_MODEL, BATCH_PROMPT_TEMPLATE, batch_key),
+            build_batch_prompt(self.snippet['language'], cells),
+            model=AI_MODEL,
+            priority=PRIORITY_SNIPPET,
+            on_progress=show_sections,
+            on_done=on_done,
+            on_error=on_error,
+            group=self
+        )
 
     def _handle_full_explain(self, e):
         self.sidebar_visible = True
         self.sidebar_content.visible = True
-        self.full_explanation_md.value = "_Анализирую весь сниппет..._"
+
+        full_text = self._snippet_text()
+        key = content_hash(self.snippet['title'], self.snippet['language'], self.snippet['tags'], full_text)
+        cached = self._cached_explanation(SNIPPET_PROMPT_TEMPLATE, key)
+
+        self.full_explanation_md.value = cached or "_Анализирую весь сниппет..._"
         self.full_explanation_md.update()
         self.sidebar_content.update()
+        if cached:
+            return
 
-        full_text = ""
-        for cell in self.snippet["cells"]:
-            if cell["type"] in ("markdown", "text"):
-                full_text += cell["content"] + "\n\n"
-            else:
-                full_text += f"```{self.snippet['language']}\n{cell['content']}\n```\n\n"
+        self._submit(self.full_explanation_md, self._snippet_prompt(full_text), SNIPPET_PROMPT_TEMPLATE, key,
+                     PRIORITY_SNIPPET, lambda ex: f"#Ошибка при запросе\n\n```\n{str(ex)}\n```")
+
+    def _submit(self, md: ft.Markdown, prompt: str, template: str, key: str, priority: int,
+                format_error: Callable[[Exception], str]):
+        """Ставит объяснение в общую очередь; ответ выводится в md по мере генерации и сохраняется в кэш."""
+        # Кэшируются только успешные ответы: после ошибки следующий клик повторит запрос
+        def on_done(response: str):
+            response = response or "Ответ от модели пуст."
+            if self.explanation_cache:
+                self.explanation_cache.put(AI_MODEL, template, key, response, snippet_id=self.snippet.get("id"))
+            self._show(md, response)
+
+        self.scheduler.submit(
+            (AI_MODEL, template, key), prompt, model=AI_MODEL, priority=priority,
+            on_progress=lambda text: self._show(md, text),
+            on_done=on_done,
+            on_error=lambda ex: self._show_error(md, format_error(ex)),
+            group=self
+        )
 
-        prompt = f"""Вы — эксперт-преподаватель по программированию. Объясните сниппет полностью:
+    def _is_loaded(self, md: ft.Markdown) -> bool:
+        """Есть ответ или запрос уже идёт; текст ошибки загруженным не считается."""
+        return bool(md.value) and md not in self._failed
 
-Название: {self.snippet['title']}
-Язык: {self.snippet['language']}
-Теги: {self.snippet['tags']}
+    def _show_error(self, md: ft.Markdown, text: str):
+        self._failed.add(md)
+        self._show(md, text)
 
-Содержимое сниппета:
-{full_text}
+    @staticmethod
+    def _show(md: ft.Markdown, text: str):
+        md.value = text
+        # Пользователь мог уйти из режима изучения, пока шёл ответ
+        if md.page:
+            md.update()
 
-Объясните подробно:
-1. Общую цель и назначение сниппета
-2. Ключевые концепции и технологии
-3. Как работает код пошагово
-4. Что должен запомнить студент?
-5. Практическое применение этого кода
+    def did_mount(self):
+        if self.prefetch:
+            threading.Thread(target=self._prefetch, daemon=True).start()
 
-Отвечайте на русском языке, структурированно и понятно.
-"""
+    def _prefetch(self):
+        """Ставит в очередь с низким приоритетом объяснения ячеек, которых ещё нет в кэше.
 
-        def worker():
+        Ячейки открытого сниппета подписываются группой экрана, в том числе на
+        задания, поставленные предыдущим экраном как "следующие"; после этого
+        устаревшие задания группы PREFETCH_NEXT_GROUP снимаются и ставятся
+        задания для новых следующих сниппетов.
+        """
+        queued = self._queue_prefetch(self.snippet, self)
+        if self.prefetch_snippets and self._active:
             try:
-                response = query_ollama(prompt, model="qwen2.5-coder:1.5b")
+                next_snippets = self.prefetch_snippets()
             except Exception as ex:
-                response = f"#Ошибка при запросе\n\n```\n{str(ex)}\n```"
+                logger.warning("Не удалось получить сниппеты для подготовки объяснений: %s", ex)
+                next_snippets = []
+            self.scheduler.cancel_group(PREFETCH_NEXT_GROUP)
+            for snippet in next_snippets:
+                queued += self._queue_prefetch(snippet, PREFETCH_NEXT_GROUP)
+        logger.debug("В очередь подготовки поставлено %s объяснений", queued)
+
+    def _queue_prefetch(self, snippet: dict, group) -> int:
+        queued = 0
+        for cell in snippet["cells"]:
+            if not self._active:
+                break
+            if cell.get("type", "code") != "code":
+                continue
+            key = cell_content_hash(snippet["language"], cell.get("content", ""))
+            if (self.explanation_cache.has(AI_MODEL, CELL_PROMPT_TEMPLATE, key)
+                    or self.explanation_cache.has(AI_MODEL, BATCH_PROMPT_TEMPLATE, key)):
+                continue
+            self.scheduler.submit(
+                (AI_MODEL, CELL_PROMPT_TEMPLATE, key),
+                build_cell_prompt(snippet["language"], cell.get("content", "")),
+                model=AI_MODEL,
+                priority=PRIORITY_PREFETCH,
+                on_done=lambda response, k=key, sid=snippet.get("id"): self.explanation_cache.put(
+                    AI_MODEL, CELL_PROMPT_TEMPLATE, k, response or "Ответ от модели пуст.", snippet_id=sid
+                ),
+                group=group
+            )
+            queued += 1
+        return queued
+
+    def _cancel_jobs(self):
+        self._active = False
+        self.scheduler.cancel_group(self)
 
-            self.full_explanation_md.value = response
-            self.full_explanation_md.update()
+    def _leave(self):
+        self._cancel_jobs()
+        self.on_back()
 
-        threading.Thread(target=worker, daemon=True).start()
+    def will_unmount(self):
+        self._cancel_jobs()
 
     def _toggle_sidebar(self, e=None):
         self.sidebar_visible = not self.sidebar_visible
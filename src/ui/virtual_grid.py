@@ -0,0 +1,91 @@
+import math
+import threading
+from typing import Callable, Optional, Tuple
+
+import flet as ft
+
+from src.ui.snippet_card import SnippetCard
+from src.utils.logging_config import get_logger
+
+logger = get_logger("ui.grid")
+
+
+class GridVirtualizer:
+    """Держит полное содержимое только у карточек сетки рядом с видимой областью.
+
+    По позиции прокрутки и геометрии GridView вычисляются видимые ряды.
+    Карточки в пределах buffer_rows от них материализуются, а дальше
+    release_rows — заменяются заглушками. Разрыв между порогами не даёт
+    карточкам на границе пересобираться при каждом событии прокрутки.
+    Геометрия повторяет SliverGridDelegateWithMaxCrossAxisExtent из Flutter.
+    """
+
+    def __init__(
+        self,
+        grid: ft.GridView,
+        viewport: Callable[[], Tuple[Optional[float], Optional[float]]],
+        buffer_rows: int = 2,
+        release_rows: int = 6
+    ):
+        self.grid = grid
+        self.viewport = viewport
+        self.buffer_rows = buffer_rows
+        self.release_rows = max(release_rows, buffer_rows)
+        self.pixels = 0.0
+        self.viewport_height: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _geometry(self) -> Tuple[int, float]:
+        """(число колонок, шаг ряда в пикселях) для текущей ширины и max_extent."""
+        width, _ = self.viewport()
+        width = width or 1200
+        spacing = self.grid.spacing or 0
+        columns = max(1, math.ceil(width / ((self.grid.max_extent or width) + spacing)))
+        tile_width = (width - spacing * (columns - 1)) / columns
+        row_extent = tile_width / (self.grid.child_aspect_ratio or 1.0) + (self.grid.run_spacing or 0)
+        return columns, max(row_extent, 1.0)
+
+    def on_scroll(self, e: ft.OnScrollEvent) -> bool:
+        self.pixels = e.pixels or 0.0
+        if e.viewport_dimension:
+            self.viewport_height = e.viewport_dimension
+        return self.apply()
+
+    def reset(self):
+        """Позиция прокрутки в начало: новый запрос или заново добавленная на страницу сетка.
+
+        Flutter не присылает событие прокрутки, когда сам сбрасывает или
+        ограничивает позицию, поэтому вызывающий код сообщает об этом явно.
+        """
+        with self._lock:
+            self.pixels = 0.0
+
+    def apply(self, update: bool = True) -> bool:
+        """Материализует/освобождает карточки по текущей позиции. True, если что-то изменилось.
+
+        При update=False отправку изменений клиенту выполняет вызывающий код.
+        """
+        with self._lock:
+            columns, row_extent = self._geometry()
+            height = self.viewport_height or self.viewport()[1] or 800
+            first_row = int(self.pixels // row_extent)
+            last_row = int((self.pixels + height) // row_extent)
+
+            materialized = released = 0
+            for index, card in enumerate(self.grid.controls):
+                if not isinstance(card, SnippetCard):
+                    continue
+                row = index // columns
+                if first_row - self.buffer_rows <= row <= last_row + self.buffer_rows:
+                    materialized += card.materialize()
+                elif row < first_row - self.release_rows or row > last_row + self.release_rows:
+                    released += card.release()
+            changed = materialized + released
+            if changed:
+                logger.debug(
+                    "Ряды %s-%s видимы: материализовано %s, освобождено %s карточек",
+                    first_row, last_row, materialized, released
+                )
+        if changed and update and self.grid.page:
+            self.grid.update()
+        return bool(changed)
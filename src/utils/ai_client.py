@@ -0,0 +1,132 @@
+# src/utils/ai_client.py
+"""HTTP-клиент локального Ollama с общим пулом соединений.
+
+Все запросы идут через один requests.Session, поэтому TCP-соединения с
+сервером переиспользуются. stream_generate читает ответ /api/generate как
+NDJSON и отдаёт токены по мере генерации, embed возвращает векторы
+/api/embed для семантического поиска. Адрес сервера задаётся
+аргументом или переменной окружения SNIPPETHUB_OLLAMA_URL, что позволяет
+направить клиент на локальную заглушку в тестах.
+"""
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.utils.constants import AI_EMBED_MODEL, AI_MODEL, OLLAMA_DEFAULT_URL
+from src.utils.logging_config import get_logger
+
+logger = get_logger("ai.client")
+
+OLLAMA_URL_ENV = "SNIPPETHUB_OLLAMA_URL"
+
+
+class OllamaError(RuntimeError):
+    """Ollama недоступен или вернул ошибку."""
+
+
+class OllamaClient:
+    def __init__(self, base_url: Optional[str] = None, timeout: float = 60.0, connect_timeout: float = 5.0,
+                 pool_size: int = 4, session: Optional[requests.Session] = None):
+        self.base_url = (base_url or os.environ.get(OLLAMA_URL_ENV) or OLLAMA_DEFAULT_URL).rstrip("/")
+        # Для потока read-таймаут действует на паузу между строками, а не на весь ответ
+        self.timeout = (connect_timeout, timeout)
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, path: str, payload: Dict, stream: bool = False,
+              timeout: Optional[float] = None) -> requests.Response:
+        request_timeout = (self.timeout[0], timeout) if timeout is not None else self.timeout
+        try:
+            response = self.session.post(
+                f"{self.base_url}{path}", json=payload, timeout=request_timeout, stream=stream
+            )
+        except requests.RequestException as e:
+            raise OllamaError(f"Не удалось подключиться к Ollama: {e}") from e
+        if response.status_code != 200:
+            text = response.text
+            response.close()
+            raise OllamaError(f"Ошибка Ollama: {response.status_code} – {text}")
+        return response
+
+    def generate(self, prompt: str, model: str = AI_MODEL,
+                 on_token: Optional[Callable[[str], None]] = None, timeout: Optional[float] = None) -> str:
+        """Полный ответ модели. С on_token ответ читается потоком и каждый токен передаётся в callback."""
+        if on_token is None:
+            response = self._post(
+                "/api/generate", {"model": model, "prompt": prompt, "stream": False}, timeout=timeout
+            )
+            try:
+                data = response.json()
+            except ValueError as e:
+                raise OllamaError(f"Некорректный ответ Ollama: {e}") from e
+            if "error" in data:
+                raise OllamaError(f"Ошибка Ollama: {data['error']}")
+            return data.get("response", "")
+
+        parts = []
+        for token in self.stream_generate(prompt, model):
+            parts.append(token)
+            on_token(token)
+        return "".join(parts)
+
+    def stream_generate(self, prompt: str, model: str = AI_MODEL) -> Iterator[str]:
+        """Токены ответа по мере генерации (NDJSON). Прекращение итерации закрывает соединение."""
+        logger.debug("Потоковый запрос к %s, модель %s, %s символов", self.base_url, model, len(prompt))
+        with self._post("/api/generate", {"model": model, "prompt": prompt, "stream": True}, stream=True) as response:
+            try:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except ValueError as e:
+                        raise OllamaError(f"Некорректная строка потока Ollama: {e}") from e
+                    if "error" in chunk:
+                        raise OllamaError(f"Ошибка Ollama: {chunk['error']}")
+                    token = chunk.get("response")
+                    if token:
+                        yield token
+                    if chunk.get("done"):
+                        return
+            except requests.RequestException as e:
+                raise OllamaError(f"Соединение с Ollama прервано: {e}") from e
+
+    def embed(self, texts: List[str], model: str = AI_EMBED_MODEL,
+              timeout: Optional[float] = None) -> List[List[float]]:
+        """Эмбеддинги текстов одним запросом к /api/embed, в том же порядке, что и texts."""
+        if not texts:
+            return []
+        logger.debug("Запрос эмбеддингов к %s, модель %s, %s текстов", self.base_url, model, len(texts))
+        response = self._post("/api/embed", {"model": model, "input": list(texts)}, timeout=timeout)
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise OllamaError(f"Некорректный ответ Ollama: {e}") from e
+        if "error" in data:
+            raise OllamaError(f"Ошибка Ollama: {data['error']}")
+        embeddings = data.get("embeddings") or []
+        if len(embeddings) != len(texts):
+            raise OllamaError(f"Ollama вернул {len(embeddings)} эмбеддингов на {len(texts)} текстов")
+        return embeddings
+
+    def close(self):
+        self.session.close()
+
+
+_client: Optional[OllamaClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    """Общий клиент процесса: один пул соединений на всё приложение."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
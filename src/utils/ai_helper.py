@@ -1,25 +1,13 @@
 # src/utils/ai_helper.py
-import requests
-import json
-from typing import List, Dict
+from src.utils.ai_client import OllamaError, get_client
+
 
 def query_ollama(prompt: str, model: str = "llama3.2", timeout: int = 60) -> str:
     """
     Отправляет запрос к локальному Ollama и возвращает ответ.
+    Соединения переиспользуются общим клиентом; для потоковой выдачи см. OllamaClient.stream_generate.
     """
-    url = "http://localhost:11434/api/generate"
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": False
-    }
-
     try:
-        response = requests.post(url, json=payload, timeout=timeout)
-        if response.status_code == 200:
-            data = response.json()
-            return data.get("response", "Ответ от модели пуст.")
-        else:
-            return f"Ошибка Ollama: {response.status_code} – {response.text}"
-    except Exception as e:
-        return f"Не удалось подключиться к Ollama: {str(e)}\n\nУбедитесь, что Ollama запущен: `ollama serve`"
\ No newline at end of file
+        return get_client().generate(prompt, model=model, timeout=timeout) or "Ответ от модели пуст."
+    except OllamaError as e:
+        return f"{e}\n\nУбедитесь, что Ollama запущен: `ollama serve`"
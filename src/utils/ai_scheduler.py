@@ -0,0 +1,224 @@
+# src/utils/ai_scheduler.py
+"""Очередь запросов к модели с ограниченным числом исполнителей.
+
+Локальная модель обслуживает один запрос за раз, поэтому задания ждут в
+очереди с приоритетом (меньше — раньше). Одинаковые промпты, уже стоящие в
+очереди или выполняющиеся, не отправляются повторно: новый подписчик
+присоединяется к существующему заданию. Подписчики объединяются в группы
+(например, экран изучения), и cancel_group снимает все их задания при уходе
+с экрана; задание, у которого не осталось подписчиков, отменяется.
+"""
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Hashable, List, Optional
+
+from src.utils.ai_client import OllamaClient, OllamaError, get_client
+from src.utils.constants import AI_MAX_CONCURRENT_JOBS, AI_MODEL, AI_STREAM_UPDATE_SECONDS
+from src.utils.logging_config import get_logger
+
+logger = get_logger("ai.scheduler")
+
+PRIORITY_INTERACTIVE = 0  # ячейка, по которой кликнул пользователь
+PRIORITY_SNIPPET = 1      # объяснение всего открытого сниппета
+PRIORITY_PREFETCH = 10    # фоновая подготовка ответов
+
+
+class _Subscriber:
+    __slots__ = ("group", "on_progress", "on_done", "on_error")
+
+    def __init__(self, group, on_progress, on_done, on_error):
+        self.group = group
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+
+
+class AIJob:
+    def __init__(self, key: Hashable, prompt: str, model: str, priority: int):
+        self.key = key
+        self.prompt = prompt
+        self.model = model
+        self.priority = priority
+        self.subscribers: List[_Subscriber] = []
+        self.running = False
+        self.cancelled = threading.Event()
+        self.text = ""
+
+
+class AIScheduler:
+    def __init__(self, workers: int = AI_MAX_CONCURRENT_JOBS,
+                 client_factory: Callable[[], OllamaClient] = get_client,
+                 update_interval: float = AI_STREAM_UPDATE_SECONDS):
+        self.workers = max(1, workers)
+        self.client_factory = client_factory
+        self.update_interval = update_interval
+        self._heap: list = []
+        self._jobs = {}  # key -> AIJob, в очереди или выполняется
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+
+    def submit(
+        self,
+        key: Hashable,
+        prompt: str,
+        model: str = AI_MODEL,
+        priority: int = PRIORITY_INTERACTIVE,
+        on_progress: Optional[Callable[[str], None]] = None,
+        on_done: Optional[Callable[[str], None]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+        group: Hashable = None
+    ) -> AIJob:
+        """Ставит промпт в очередь или подписывается на такое же задание.
+
+        on_progress получает весь накопленный текст (не чаще update_interval),
+        on_done — полный ответ, on_error — OllamaError. Колбэки вызываются в
+        потоке исполнителя.
+        """
+        subscriber = _Subscriber(group, on_progress, on_done, on_error)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Планировщик AI остановлен")
+            job = self._jobs.get(key)
+            if job is None:
+                job = AIJob(key, prompt, model, priority)
+                self._jobs[key] = job
+                heapq.heappush(self._heap, (priority, next(self._seq), job))
+                self._ensure_workers()
+                self._cond.notify()
+            else:
+                logger.debug("Промпт %s уже в работе, добавлен подписчик", key)
+                if not job.running and priority < job.priority:
+                    # Устаревшая запись в куче будет пропущена по несовпадению приоритета
+                    job.priority = priority
+                    heapq.heappush(self._heap, (priority, next(self._seq), job))
+                    self._cond.notify()
+            job.subscribers.append(subscriber)
+            text = job.text
+        if text and on_progress:
+            on_progress(text)
+        return job
+
+    def cancel_group(self, group: Hashable):
+        """Отписывает группу от всех заданий; задания без подписчиков отменяются."""
+        with self._cond:
+            for key, job in list(self._jobs.items()):
+                job.subscribers = [s for s in job.subscribers if s.group != group]
+                if not job.subscribers:
+                    job.cancelled.set()
+                    del self._jobs[key]
+                    logger.debug("Задание %s отменено", key)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._jobs)
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            for job in self._jobs.values():
+                job.cancelled.set()
+            self._jobs.clear()
+            self._heap.clear()
+            self._cond.notify_all()
+
+    def _ensure_workers(self):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_job(self) -> Optional[AIJob]:
+        with self._cond:
+            while True:
+                while self._heap:
+                    priority, _, job = heapq.heappop(self._heap)
+                    if job.cancelled.is_set() or job.running or priority != job.priority:
+                        continue
+                    job.running = True
+                    return job
+                if self._closed:
+                    return None
+                self._cond.wait()
+
+    def _subscribers(self, job: AIJob) -> List[_Subscriber]:
+        with self._cond:
+            return list(job.subscribers)
+
+    def _finish(self, job: AIJob) -> List[_Subscriber]:
+        """Снимает задание с учёта и возвращает его окончательных подписчиков.
+
+        Удаление из _jobs и снимок подписчиков делаются под одной блокировкой:
+        submit после этого создаёт новое задание, а не подписывается на
+        завершённое и не теряет результат.
+        """
+        with self._cond:
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+            if job.cancelled.is_set():
+                return []
+            return list(job.subscribers)
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                self._run(job)
+            except Exception:
+                logger.exception("Ошибка в задании AI %s", job.key)
+            finally:
+                with self._cond:
+                    if self._jobs.get(job.key) is job:
+                        del self._jobs[job.key]
+
+    def _run(self, job: AIJob):
+        logger.debug("Выполнение задания %s (приоритет %s)", job.key, job.priority)
+        parts = []
+        last_update = time.monotonic()
+        try:
+            tokens = self.client_factory().stream_generate(job.prompt, model=job.model)
+            try:
+                for token in tokens:
+                    if job.cancelled.is_set():
+                        return
+                    parts.append(token)
+                    now = time.monotonic()
+                    if now - last_update >= self.update_interval:
+                        last_update = now
+                        text = "".join(parts)
+                        with self._cond:
+                            job.text = text
+                        for sub in self._subscribers(job):
+                            if sub.on_progress:
+                                sub.on_progress(text)
+            finally:
+                # Закрывает HTTP-ответ, если итерация прервана отменой
+                tokens.close()
+        except OllamaError as ex:
+            for sub in self._finish(job):
+                if sub.on_error:
+                    sub.on_error(ex)
+            return
+        response = "".join(parts)
+        for sub in self._finish(job):
+            if sub.on_done:
+                sub.on_done(response)
+
+
+_scheduler: Optional[AIScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> AIScheduler:
+    """Общий планировщик процесса: все экраны делят одну очередь к модели."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = AIScheduler()
+        return _scheduler
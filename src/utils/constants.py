@@ -27,4 +27,44 @@ LANGUAGE_LABELS = {
     "html": "HTML",
     "java": "Java",
     "cpp": "C++"
-}
\ No newline at end of file
+}
+
+# Размер страницы сетки сниппетов (keyset-пагинация по id DESC)
+SNIPPETS_PAGE_SIZE = 24
+# За сколько пикселей до конца прокрутки подгружать следующую страницу
+GRID_LOAD_MORE_THRESHOLD = 600
+# Виртуализация сетки: полное содержимое строится только у карточек рядом с видимой областью
+GRID_VIRTUALIZATION = True
+# Сколько рядов над/под экраном материализуется заранее и после скольких карточка освобождается
+GRID_BUFFER_ROWS = 2
+GRID_RELEASE_ROWS = 6
+# Пауза ввода в поле поиска перед запросом к БД, секунды
+SEARCH_DEBOUNCE_SECONDS = 0.25
+# Длинная сторона миниатюр изображений в сетке и превью ячеек, пиксели
+THUMBNAIL_MAX_SIDE = 256
+# Максимальный размер изображения, которое редактор загружает в базу, байты
+BLOB_MAX_BYTES = 10 * 1024 * 1024
+# Превью карточки в сетке: первые строки первой кодовой/текстовой ячейки
+PREVIEW_MAX_LINES = 12
+PREVIEW_MAX_CHARS = 600
+# Живое превью ячейки в редакторе: перерисовка после паузы ввода, но не реже чем раз в MAX_WAIT
+CELL_PREVIEW_DELAY_SECONDS = 0.2
+CELL_PREVIEW_MAX_WAIT_SECONDS = 0.5
+# Локальный сервер Ollama и модель для объяснений в режиме изучения
+OLLAMA_DEFAULT_URL = "http://localhost:11434"
+AI_MODEL = "qwen2.5-coder:1.5b"
+# Как часто потоковый ответ модели перерисовывается в Markdown, секунды
+AI_STREAM_UPDATE_SECONDS = 0.1
+# Кэш объяснений AI: срок жизни записи и максимальное число записей
+AI_CACHE_TTL_SECONDS = 30 * 24 * 3600
+AI_CACHE_MAX_ENTRIES = 5000
+# Сколько запросов к модели выполняется одновременно (локальный Ollama обслуживает один)
+AI_MAX_CONCURRENT_JOBS = 1
+# Фоновая подготовка объяснений ячеек при открытии режима изучения (по умолчанию выключена):
+# SNIPPETHUB_AI_PREFETCH=1 включает её, SNIPPETHUB_AI_PREFETCH_NEXT=N добавляет N следующих сниппетов сетки
+AI_PREFETCH_ENV = "SNIPPETHUB_AI_PREFETCH"
+AI_PREFETCH_NEXT_ENV = "SNIPPETHUB_AI_PREFETCH_NEXT"
+# Семантический поиск: модель эмбеддингов Ollama, размер пачки текстов на запрос и число результатов
+AI_EMBED_MODEL = "nomic-embed-text"
+EMBED_BATCH_SIZE = 32
+SEMANTIC_SEARCH_LIMIT = 50
@@ -0,0 +1,105 @@
+# src/utils/debounce.py
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+class Debouncer:
+    """Откладывает вызов callback до паузы во входящих событиях.
+
+    Каждый новый вызов trigger() перезапускает таймер, поэтому callback
+    выполняется один раз — через delay секунд после последнего события.
+    Если задан max_wait, при непрерывном потоке событий callback всё равно
+    вызывается не реже чем раз в max_wait секунд с последними аргументами.
+    Вызов происходит в потоке таймера.
+    """
+
+    def __init__(self, delay: float, callback: Callable[..., Any], max_wait: Optional[float] = None):
+        self.delay = delay
+        self.callback = callback
+        self.max_wait = max_wait
+        self._timer: Optional[threading.Timer] = None
+        self._pending_since: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def trigger(self, *args, **kwargs):
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+            now = time.monotonic()
+            if self._pending_since is None:
+                self._pending_since = now
+            delay = self.delay
+            if self.max_wait is not None:
+                delay = max(0.0, min(delay, self._pending_since + self.max_wait - now))
+            self._timer = threading.Timer(delay, self._fire, args, kwargs)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _fire(self, *args, **kwargs):
+        with self._lock:
+            if self._timer is threading.current_thread():
+                self._timer = None
+                self._pending_since = None
+        self.callback(*args, **kwargs)
+
+    def cancel(self):
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            self._pending_since = None
+
+
+class SearchController:
+    """Поиск с debounce: запрос к БД выполняется вне UI-потока, применяется только последний результат.
+
+    fetch(query) выполняется в фоновом потоке. Если за это время пришёл более
+    новый запрос, результат устаревшего отбрасывается и apply не вызывается.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Any],
+        apply: Callable[[str, Any], None],
+        delay: float = 0.3,
+        on_error: Optional[Callable[[Exception], None]] = None
+    ):
+        self.fetch = fetch
+        self.apply = apply
+        self.on_error = on_error
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._apply_lock = threading.Lock()
+        self._debouncer = Debouncer(delay, self._run)
+
+    def submit(self, query: str):
+        """Новый ввод пользователя: предыдущие запросы становятся устаревшими."""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        self._debouncer.trigger(query, generation)
+
+    def cancel(self):
+        """Отменяет ожидающий запрос и отбрасывает результат выполняющегося."""
+        with self._lock:
+            self._generation += 1
+        self._debouncer.cancel()
+
+    def _is_current(self, generation: int) -> bool:
+        with self._lock:
+            return generation == self._generation
+
+    def _run(self, query: str, generation: int):
+        if not self._is_current(generation):
+            return
+        try:
+            result = self.fetch(query)
+        except Exception as ex:
+            if self.on_error and self._is_current(generation):
+                self.on_error(ex)
+            return
+        # Пока шёл запрос, пользователь мог ввести ещё символы
+        with self._apply_lock:
+            if self._is_current(generation):
+                self.apply(query, result)
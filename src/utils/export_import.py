@@ -1,46 +1,275 @@
 # src/utils/export_import.py
+import base64
+import binascii
+import codecs
+import itertools
 import json
+import os
+import re
 from datetime import datetime
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
 
+from src.models.blob_store import blob_key, is_blob_ref
 from src.models.database import Database
+from src.utils.logging_config import get_logger
 
+logger = get_logger("export")
 
-def export_snippets(db: Database) -> str:
-    """Экспортирует ВСЕ сниппеты в JSON"""
-    snippets = db.get_all_snippets()
-    export_data = {
-        "version": "1.0",
-        "exported_at": datetime.now().isoformat(),
-        "snippets": []
+EXPORT_VERSION = "1.0"
+FORMAT_JSON = "json"
+FORMAT_JSONL = "jsonl"
+IMPORT_BATCH_SIZE = 500
+IMPORT_CHUNK_SIZE = 64 * 1024
+
+_SNIPPETS_ARRAY_RE = re.compile(r'"snippets"\s*:\s*\[')
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def _export_blobs(db: Database, cells: List[Dict]) -> Dict[str, str]:
+    """Байты изображений, на которые ссылаются ячейки, в base64 по SHA-256."""
+    blobs = {}
+    for cell in cells:
+        content = cell.get("content")
+        if cell.get("type") == "image" and is_blob_ref(content) and blob_key(content) not in blobs:
+            data = db.blobs.get(blob_key(content))
+            if data is None:
+                logger.warning("Изображение %s отсутствует в базе и не попадёт в экспорт", content)
+                continue
+            blobs[blob_key(content)] = base64.b64encode(data).decode("ascii")
+    return blobs
+
+
+def _export_record(db: Database, snippet: Dict) -> Dict:
+    cells = list(snippet["cells"])
+    record = {
+        "id": snippet["id"],
+        "title": snippet["title"],
+        "language": snippet["language"],
+        "tags": snippet["tags"].split(",") if snippet["tags"] else [],
+        "cells": cells
     }
+    # Каждая запись самодостаточна: её можно импортировать отдельно, в том числе при продолжении импорта
+    blobs = _export_blobs(db, cells)
+    if blobs:
+        record["blobs"] = blobs
+    return record
+
+
+def export_snippets(
+    db: Database,
+    path: str,
+    fmt: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None,
+    batch_size: int = 200
+) -> int:
+    """Потоково экспортирует все сниппеты в файл, возвращает их число.
+
+    fmt — "jsonl" (по сниппету на строку) или "json" (объект с массивом
+    snippets, записываемым по элементу); по умолчанию определяется по
+    расширению path. Сниппеты читаются курсором порциями, поэтому память не
+    зависит от размера библиотеки. Изображения ячеек сохраняются в поле
+    blobs записи (base64). progress(done, total) вызывается после
+    каждого сниппета. Файл пишется во временный и заменяет path только при
+    успешном завершении.
+    """
+    fmt = fmt or (FORMAT_JSONL if path.lower().endswith(".jsonl") else FORMAT_JSON)
+    if fmt not in (FORMAT_JSON, FORMAT_JSONL):
+        raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+    total = db.count_snippets() if progress else 0
+    logger.debug("Экспорт %s сниппетов в %s (%s)", total, path, fmt)
+
+    tmp_path = path + ".part"
+    done = 0
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            if fmt == FORMAT_JSON:
+                f.write('{"version": %s, "exported_at": %s, "snippets": [' % (
+                    json.dumps(EXPORT_VERSION), json.dumps(datetime.now().isoformat())
+                ))
+            for snippet in db.iter_snippets(batch_size=batch_size):
+                record = json.dumps(_export_record(db, snippet), ensure_ascii=False)
+                if fmt == FORMAT_JSONL:
+                    f.write(record + "\n")
+                else:
+                    f.write(("\n" if done == 0 else ",\n") + record)
+                done += 1
+                if progress:
+                    progress(done, total)
+            if fmt == FORMAT_JSON:
+                f.write("\n]}\n")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    logger.debug("Экспортировано %s сниппетов", done)
+    return done
+
+
+def _import_record(snippet: Dict) -> Dict:
+    tags = snippet.get("tags") or []
+    return {
+        "title": snippet["title"],
+        "language": snippet.get("language", "markdown"),
+        "cells": snippet.get("cells", []),
+        "tags": ",".join(tags) if isinstance(tags, list) else tags,
+        "blobs": snippet.get("blobs") or {}
+    }
+
 
-    for s in snippets:
-        export_data["snippets"].append({
-            "id": s["id"],
-            "title": s["title"],
-            "language": s["language"],
-            "tags": s["tags"].split(",") if s["tags"] else [],
-            "cells": json.loads(s["cells"]),  # ваш текущий формат
-            "created_at": s["created_at"],
-            "updated_at": s["updated_at"]
-        })
+def _restore_blobs(db: Database, records: List[Dict]):
+    """Загружает изображения из записей экспорта; вызывается в транзакции пачки."""
+    for record in records:
+        for key, encoded in record["blobs"].items():
+            try:
+                data = base64.b64decode(encoded, validate=True)
+            except (binascii.Error, ValueError, TypeError) as e:
+                logger.warning("Изображение %s в файле импорта повреждено: %s", key, e)
+                continue
+            db.blobs.restore(key, data)
 
-    return json.dumps(export_data, indent=2, ensure_ascii=False)
 
+def import_snippets(db: Database, json_data: str, on_duplicate: str = "skip") -> dict:
+    """Импортирует сниппеты из JSON-строки одной транзакцией.
 
-def import_snippets(db: Database, json_data: str):
-    """Импортирует сниппеты из JSON"""
+    Сниппеты с уже существующими названиями пропускаются (on_duplicate="update" —
+    перезаписываются). Возвращает счётчики inserted/updated/skipped.
+    Для больших файлов используйте import_snippets_file.
+    """
     data = json.loads(json_data)
+    records = [_import_record(snippet) for snippet in data["snippets"]]
+    with db.transaction():
+        _restore_blobs(db, records)
+        return db.add_snippets_many(records, on_duplicate=on_duplicate)
+
+
+def _iter_jsonl_records(f: BinaryIO, offset: int) -> Iterator[Tuple[Dict, int]]:
+    """Записи JSON Lines начиная с байтового смещения offset: (запись, смещение следующей строки)."""
+    f.seek(offset)
+    for line in iter(f.readline, b""):
+        offset += len(line)
+        line = line.strip()
+        if line:
+            yield json.loads(line), offset
+
+
+def _iter_json_records(f: BinaryIO, chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[Tuple[Dict, int]]:
+    """Элементы массива snippets из JSON-файла без загрузки файла целиком: (запись, прочитано байт).
+
+    Принимает как формат export_snippets ({"version": ..., "snippets": [...]}),
+    так и просто массив сниппетов. Ключ snippets ищется в тексте, поэтому
+    поля перед ним должны быть скалярными, как в собственном экспорте.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buf, pos, bytes_read, eof = "", 0, 0, False
+
+    def fill():
+        nonlocal buf, pos, bytes_read, eof
+        chunk = f.read(chunk_size)
+        bytes_read += len(chunk)
+        eof = not chunk
+        buf = buf[pos:] + text_decoder.decode(chunk, final=eof)
+        pos = 0
+
+    while True:
+        stripped = buf.lstrip()
+        if stripped.startswith("["):
+            pos = len(buf) - len(stripped) + 1
+            break
+        match = _SNIPPETS_ARRAY_RE.search(buf)
+        if match:
+            pos = match.end()
+            break
+        if eof:
+            raise ValueError("В файле импорта не найден массив snippets")
+        fill()
+
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("Файл импорта обрывается внутри массива snippets")
+            fill()
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            record, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Запись ещё не прочитана целиком — догружаем следующий блок
+            if eof:
+                raise
+            fill()
+            continue
+        pos = end
+        yield record, bytes_read
+
+
+def import_snippets_file(
+    db: Database,
+    path: str,
+    on_duplicate: str = "skip",
+    batch_size: int = IMPORT_BATCH_SIZE,
+    progress: Optional[ProgressCallback] = None,
+    resume: bool = True
+) -> Dict[str, int]:
+    """Потоковый импорт из .json или .jsonl файла пачками по batch_size.
+
+    Каждая пачка записывается одной транзакцией вместе с контрольной точкой,
+    поэтому прерванный импорт того же (неизменённого) файла продолжается с
+    места остановки, а уже записанные сниппеты не дублируются. progress(done,
+    total) получает прочитанные и общие байты. Возвращает счётчики
+    inserted/updated/skipped за весь импорт, включая прерванные запуски.
+    """
+    source = os.path.abspath(path)
+    stat = os.stat(path)
+    fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}"
+    is_jsonl = path.lower().endswith(".jsonl")
+
+    checkpoint = db.get_import_checkpoint(source) if resume else None
+    if checkpoint and checkpoint["fingerprint"] != fingerprint:
+        logger.debug("Файл %s изменился с прошлого импорта, начинаем заново", source)
+        checkpoint = None
+    if not checkpoint:
+        checkpoint = {"fingerprint": fingerprint, "byte_offset": 0, "records": 0,
+                      "inserted": 0, "updated": 0, "skipped": 0}
+    elif checkpoint["records"]:
+        logger.debug("Продолжение импорта %s с записи %s", source, checkpoint["records"])
+
+    def flush(batch: List[Dict], byte_offset: int):
+        # Пачка и контрольная точка коммитятся вместе: после сбоя нет ни дублей, ни пропусков
+        with db.transaction():
+            _restore_blobs(db, batch)
+            counts = db.add_snippets_many(batch, on_duplicate=on_duplicate)
+            for key, value in counts.items():
+                checkpoint[key] += value
+            checkpoint["records"] += len(batch)
+            checkpoint["byte_offset"] = byte_offset
+            db.save_import_checkpoint(source, checkpoint)
+
+    with open(path, "rb") as f:
+        if is_jsonl:
+            records = _iter_jsonl_records(f, checkpoint["byte_offset"])
+        else:
+            # Смещения в JSON-массиве не пригодны для seek: уже импортированные записи пропускаются разбором
+            records = itertools.islice(_iter_json_records(f), checkpoint["records"], None)
+
+        batch, position = [], checkpoint["byte_offset"]
+        for record, position in records:
+            batch.append(_import_record(record))
+            if len(batch) >= batch_size:
+                flush(batch, position)
+                batch = []
+            if progress:
+                progress(position, stat.st_size)
+        if batch:
+            flush(batch, position)
 
-    for snippet in data["snippets"]:
-        # Проверяем, нет ли такого сниппета
-        existing = db.get_snippet_by_title(snippet["title"])
-        if existing:
-            continue  # или обновляем
-
-        db.add_snippet(
-            title=snippet["title"],
-            language=snippet["language"],
-            cells=snippet["cells"],
-            tags=",".join(snippet["tags"])
-        )
\ No newline at end of file
+    db.clear_import_checkpoint(source)
+    result = {key: checkpoint[key] for key in ("inserted", "updated", "skipped")}
+    logger.debug("Импорт %s завершён: %s", source, result)
+    return result
@@ -0,0 +1,38 @@
+# src/utils/logging_config.py
+import logging
+import os
+from typing import Optional, Union
+
+ROOT_LOGGER_NAME = "snippethub"
+LOG_LEVEL_ENV = "SNIPPETHUB_LOG_LEVEL"
+DEFAULT_LOG_LEVEL = "WARNING"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Логгер подсистемы в иерархии snippethub, например get_logger("db") -> snippethub.db."""
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def setup_logging(level: Optional[Union[str, int]] = None) -> logging.Logger:
+    """Настраивает логгер snippethub; корневой логгер Python не трогается.
+
+    Уровень берётся из аргумента, затем из переменной окружения
+    SNIPPETHUB_LOG_LEVEL, по умолчанию WARNING — отладочные сообщения
+    горячих путей при этом даже не форматируются.
+    """
+    if level is None:
+        level = os.environ.get(LOG_LEVEL_ENV, DEFAULT_LOG_LEVEL)
+    if isinstance(level, str):
+        level = logging.getLevelName(level.strip().upper())
+        if not isinstance(level, int):
+            level = logging.getLevelName(DEFAULT_LOG_LEVEL)
+
+    logger = logging.getLogger(ROOT_LOGGER_NAME)
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logger.addHandler(handler)
+    logger.propagate = False
+    return logger
@@ -0,0 +1,115 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.utils.ai_client import OLLAMA_URL_ENV, OllamaClient, OllamaError
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Заглушка Ollama: /api/generate потоком NDJSON, /api/embed, модель "missing" — ошибка 404."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, payload: dict):
+        line = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if body.get("model") == "missing":
+            self._send_json(404, {"error": "model 'missing' not found"})
+            return
+        if self.path == "/api/embed":
+            self._send_json(200, {"embeddings": [[float(len(text)), 1.0] for text in body["input"]]})
+            return
+        if not body.get("stream"):
+            self._send_json(200, {"response": "echo: " + body["prompt"], "done": True})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in ("При", "вет", ", мир"):
+            self._send_chunk({"response": token, "done": False})
+        if body["prompt"] == "fail":
+            self._send_chunk({"error": "out of memory"})
+        else:
+            self._send_chunk({"response": "", "done": True})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+@pytest.fixture
+def stub_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllamaHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stub_url):
+    client = OllamaClient(base_url=stub_url, timeout=5.0)
+    yield client
+    client.close()
+
+
+def test_stream_generate_yields_tokens_in_order(client):
+    assert list(client.stream_generate("hi")) == ["При", "вет", ", мир"]
+
+
+def test_generate_with_callback_collects_streamed_tokens(client):
+    tokens = []
+    assert client.generate("hi", on_token=tokens.append) == "Привет, мир"
+    assert tokens == ["При", "вет", ", мир"]
+
+
+def test_generate_without_callback_uses_single_response(client):
+    assert client.generate("hi") == "echo: hi"
+
+
+def test_embed_returns_vector_per_text(client):
+    assert client.embed(["a", "abc"]) == [[1.0, 1.0], [3.0, 1.0]]
+    assert client.embed([]) == []
+
+
+def test_http_error_raises_ollama_error(client):
+    with pytest.raises(OllamaError, match="404"):
+        list(client.stream_generate("hi", model="missing"))
+    with pytest.raises(OllamaError, match="404"):
+        client.embed(["a"], model="missing")
+
+
+def test_error_inside_stream_raises_after_partial_tokens(client):
+    received = []
+    with pytest.raises(OllamaError, match="out of memory"):
+        for token in client.stream_generate("fail"):
+            received.append(token)
+    assert received == ["При", "вет", ", мир"]
+
+
+def test_unreachable_server_raises_ollama_error():
+    client = OllamaClient(base_url="http://127.0.0.1:9", connect_timeout=1.0)
+    with pytest.raises(OllamaError):
+        client.generate("hi")
+
+
+def test_base_url_from_environment(monkeypatch, stub_url):
+    monkeypatch.setenv(OLLAMA_URL_ENV, stub_url + "/")
+    client = OllamaClient()
+    assert client.base_url == stub_url
+    assert client.generate("env") == "echo: env"
@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+from src.utils.ai_scheduler import (
+    PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, PRIORITY_SNIPPET, AIScheduler
+)
+
+
+class FakeClient:
+    """Заглушка OllamaClient: отвечает "ответ: <промпт>" и ждёт gate перед промптом "block"."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def stream_generate(self, prompt, model=None):
+        with self.lock:
+            self.prompts.append(prompt)
+        if prompt == "block":
+            self.started.set()
+            self.gate.wait(5)
+        yield "ответ: "
+        yield prompt
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+@pytest.fixture
+def scheduler(client):
+    scheduler = AIScheduler(workers=1, client_factory=lambda: client, update_interval=0)
+    yield scheduler
+    client.gate.set()
+    scheduler.shutdown()
+
+
+def wait_for(event: threading.Event):
+    assert event.wait(5), "задание не завершилось"
+
+
+def test_late_subscriber_gets_fresh_result(scheduler):
+    late_done = threading.Event()
+    results = []
+
+    def late(text):
+        results.append(text)
+        late_done.set()
+
+    def first(text):
+        # Подписка из колбэка завершения: задание уже снято с учёта,
+        # поэтому промпт ставится заново, а не теряется
+        scheduler.submit("k", "p", on_done=late)
+
+    scheduler.submit("k", "p", on_done=first)
+    wait_for(late_done)
+    assert results == ["ответ: p"]
+
+
+def test_priority_upgrade_runs_job_earlier(scheduler, client):
+    done = threading.Event()
+    scheduler.submit("block", "block")
+    wait_for(client.started)
+    scheduler.submit("a", "a", priority=PRIORITY_PREFETCH)
+    scheduler.submit("b", "b", priority=PRIORITY_SNIPPET)
+    scheduler.submit("a", "a", priority=PRIORITY_INTERACTIVE)
+    scheduler.submit("c", "c", priority=PRIORITY_PREFETCH, on_done=lambda text: done.set())
+    client.gate.set()
+    wait_for(done)
+    assert client.prompts == ["block", "a", "b", "c"]
+
+
+def test_cancel_group_drops_only_unshared_jobs(scheduler, client):
+    shared_done = threading.Event()
+    tail_done = threading.Event()
+    cancelled = []
+    scheduler.submit("block", "block")
+    wait_for(client.started)
+    scheduler.submit("solo", "solo", group="study", on_done=cancelled.append)
+    scheduler.submit("shared", "shared", group="study", on_done=cancelled.append)
+    scheduler.submit("shared", "shared", group="grid", on_done=lambda text: shared_done.set())
+    scheduler.cancel_group("study")
+    scheduler.submit("tail", "tail", priority=PRIORITY_PREFETCH, on_done=lambda text: tail_done.set())
+    client.gate.set()
+    wait_for(shared_done)
+    wait_for(tail_done)
+    assert cancelled == []
+    assert "solo" not in client.prompts
+    assert scheduler.pending() == 0
@@ -0,0 +1,103 @@
+import io
+import json
+
+import pytest
+
+from src.models.database import Database
+from src.utils.export_import import (
+    _iter_json_records, _iter_jsonl_records, export_snippets, import_snippets_file
+)
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 16
+
+RECORDS = [
+    {"title": "Привет", "language": "python", "tags": ["a"], "cells": [{"type": "code", "content": "print('}]')"}]},
+    {"title": "quotes \" and \\ slashes", "language": "bash", "tags": [], "cells": []},
+    {"title": "nested", "language": "json", "tags": [], "cells": [{"type": "text", "content": "{\"k\": [1, 2]}"}]},
+]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Database кладёт файл в ./src относительно текущего каталога
+    monkeypatch.chdir(tmp_path)
+    database = Database("test.db")
+    yield database
+    database.close()
+
+
+def _json_bytes(payload) -> io.BytesIO:
+    return io.BytesIO(json.dumps(payload, ensure_ascii=False, indent=1).encode("utf-8"))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_json_reader_yields_records_across_chunk_boundaries(chunk_size):
+    f = _json_bytes({"version": "1.0", "exported_at": "now", "snippets": RECORDS})
+    records = list(_iter_json_records(f, chunk_size=chunk_size))
+    assert [record for record, _ in records] == RECORDS
+    positions = [position for _, position in records]
+    assert positions == sorted(positions)
+
+
+def test_json_reader_accepts_bare_array():
+    assert [record for record, _ in _iter_json_records(_json_bytes(RECORDS), chunk_size=5)] == RECORDS
+
+
+def test_json_reader_rejects_missing_or_truncated_array():
+    with pytest.raises(ValueError):
+        list(_iter_json_records(io.BytesIO(b'{"version": "1.0"}')))
+    truncated = _json_bytes({"snippets": RECORDS}).getvalue()[:-10]
+    with pytest.raises(ValueError):
+        list(_iter_json_records(io.BytesIO(truncated), chunk_size=8))
+
+
+def test_jsonl_reader_resumes_from_byte_offset():
+    data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in RECORDS).encode("utf-8")
+    first = list(_iter_jsonl_records(io.BytesIO(data), 0))
+    assert [record for record, _ in first] == RECORDS
+    resumed = list(_iter_jsonl_records(io.BytesIO(data), first[0][1]))
+    assert [record for record, _ in resumed] == RECORDS[1:]
+
+
+@pytest.mark.parametrize("ext", ["json", "jsonl"])
+def test_import_resumes_after_interruption_without_duplicates(db, tmp_path, ext):
+    path = tmp_path / f"snippets.{ext}"
+    records = [{"title": f"s{i}", "language": "python", "tags": [], "cells": []} for i in range(10)]
+    if ext == "jsonl":
+        path.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+    else:
+        path.write_text(json.dumps({"version": "1.0", "snippets": records}), encoding="utf-8")
+
+    calls = []
+
+    def crash_after_first_batch(done, total):
+        calls.append(done)
+        if len(calls) == 5:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        import_snippets_file(db, str(path), batch_size=4, progress=crash_after_first_batch)
+    assert db.count_snippets() == 4
+
+    result = import_snippets_file(db, str(path), batch_size=4)
+    assert result == {"inserted": 10, "updated": 0, "skipped": 0}
+    assert sorted(s["title"] for s in db.get_snippets()) == sorted(r["title"] for r in records)
+
+
+@pytest.mark.parametrize("ext", ["json", "jsonl"])
+def test_export_import_round_trip_keeps_images(db, tmp_path, ext):
+    image = tmp_path / "image.png"
+    image.write_bytes(PNG)
+    db.add_snippet("with image", "python", [{"type": "image", "content": str(image)}, {"type": "code", "content": "x"}])
+    path = tmp_path / f"export.{ext}"
+    assert export_snippets(db, str(path)) == 1
+
+    restored = Database(f"restored_{ext}.db")
+    try:
+        assert import_snippets_file(restored, str(path))["inserted"] == 1
+        snippet = restored.get_snippets()[0]
+        ref = snippet["cells"][0]["content"]
+        assert ref.startswith("blob:")
+        assert restored.blobs.get(ref[len("blob:"):]) == PNG
+    finally:
+        restored.close()
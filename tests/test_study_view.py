@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from src.models.database import Database
+from src.models.explanation_cache import cell_content_hash
+from src.ui.study_view import BATCH_PROMPT_TEMPLATE, CELL_PROMPT_TEMPLATE, StudySnippetView, split_cell_answers
+from src.utils.ai_client import OllamaError
+from src.utils.ai_scheduler import AIScheduler
+from src.utils.constants import AI_MODEL
+
+SNIPPET = {
+    "id": 1, "title": "t", "language": "python", "tags": "",
+    "cells": [{"type": "code", "content": "a = 1"}, {"type": "code", "content": "b = 2"},
+              {"type": "code", "content": "c = 3"}],
+}
+
+
+class ScriptedClient:
+    """Заглушка OllamaClient: отдаёт ответы из очереди; исключение в очереди выбрасывается."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def stream_generate(self, prompt, model=None):
+        with self.lock:
+            self.prompts.append(prompt)
+            answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        yield answer
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "ответ модели не дошёл до экрана"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database = Database("test.db")
+    yield database
+    database.close()
+
+
+def make_view(db, client):
+    scheduler = AIScheduler(workers=1, client_factory=lambda: client, update_interval=0)
+    view = StudySnippetView(SNIPPET, on_back=lambda: None, explanation_cache=db.explanations, scheduler=scheduler)
+    view.build()
+    return view
+
+
+def test_cell_click_after_error_resubmits(db):
+    client = ScriptedClient(OllamaError("нет связи"), "объяснение")
+    view = make_view(db, client)
+    md = view.explanation_markdowns[0]
+
+    view._explain_cell(None, 0, "a = 1")
+    wait_until(lambda: "Ошибка" in (md.value or ""))
+    view._explain_cell(None, 0, "a = 1")
+    wait_until(lambda: md.value == "объяснение")
+    assert len(client.prompts) == 2
+
+
+def test_split_cell_answers_drops_preamble():
+    text = "Вот объяснения:\n### CELL 0\nпервая\n\n### CELL 2:\nтретья"
+    assert split_cell_answers(text) == {0: "первая", 2: "третья"}
+
+
+def test_split_cell_answers_ignores_markers_in_fences():
+    text = "### CELL 0\n```python\n### CELL 1\nx = 1\n```\nконец\n### CELL 1\nвторая"
+    answers = split_cell_answers(text)
+    assert answers[0] == "```python\n### CELL 1\nx = 1\n```\nконец"
+    assert answers[1] == "вторая"
+
+
+def test_batch_caches_sections_and_falls_back_for_missing(db):
+    client = ScriptedClient("### CELL 0\nпервая\n### CELL 2\nтретья", "вторая отдельно")
+    view = make_view(db, client)
+
+    view._handle_batch_explain(None)
+    wait_until(lambda: view.explanation_markdowns[1].value == "вторая отдельно")
+    assert [view.explanation_markdowns[i].value for i in range(3)] == ["первая", "вторая отдельно", "третья"]
+    assert len(client.prompts) == 2
+    key = cell_content_hash("python", "a = 1")
+    assert db.explanations.get(AI_MODEL, BATCH_PROMPT_TEMPLATE, key) == "первая"
+    assert db.explanations.get(AI_MODEL, CELL_PROMPT_TEMPLATE, key) is None
+    assert db.explanations.get(AI_MODEL, CELL_PROMPT_TEMPLATE, cell_content_hash("python", "b = 2")) \
+        == "вторая отдельно"
+
+    # Новый экран берёт разделы пакетного ответа из кэша, не обращаясь к модели
+    again = make_view(db, client)
+    again._explain_cell(None, 0, "a = 1")
+    assert again.explanation_markdowns[0].value == "первая"
+    assert len(client.prompts) == 2